@@ -0,0 +1,313 @@
+#!/bin/python3
+
+# scenario benchmarks of the simulation, compared against a committed baseline
+#
+# usage: python benchmark.py [scenario ...] [--ticks N] [--repeat N] [--physics numpy] [--threshold 0.2]
+#                            [--update-baseline]
+# every scenario runs headless in its own process, so its peak memory isn't inflated by the scenarios before it.
+# The baseline is only meaningful on the machine it was recorded on; update it there before comparing a change
+
+import argparse
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+from contextlib import redirect_stdout
+from time import perf_counter
+
+try:
+    import resource
+except ImportError:  # not available on windows, peak memory isn't measured there
+    resource = None
+
+# SDL reads these when the display is initialized
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import pygame
+
+from event_handling import event_handler
+from events import AttackEvent
+from levels import level_builder
+from game_components import Schagel, Weapon
+from physics import PHYSICS_BACKENDS
+import log
+from configurations import *
+
+RESULT_PREFIX = 'BENCHMARK '  # marks the result line when a scenario is run by hand
+
+# metric: (higher is better, differences smaller than this are noise; None: only reported)
+METRICS = {'ticks_per_second': (True, None),  # compared as mean_ms, which has a fixed noise floor
+           'mean_ms': (False, 0.05),
+           'p50_ms': (False, 0.1),
+           'p99_ms': (False, 0.5),  # single slow ticks (gc, os) make it jumpy
+           'peak_rss_mb': (False, 5),
+           'alloc_kb_per_tick': (False, 0.5),  # traced, the same every run
+           # event microbenchmark
+           'construct_us': (False, 0.5),
+           'dispatch_us': (False, 1),
+           'burst_max_frame_ms': (False, 1)}
+EVENT_BENCHMARK = 'events'  # not a level, measures the event system on its own
+
+
+class Scenario:
+    """A level, changed once by setup(level) after it's built, and driven by step(level, tick) before every tick"""
+
+    def __init__(self, name, level_number, setup=None, step=None):
+        self.name = name
+        self.level_number = level_number
+        self.setup = setup
+        self.step = step
+
+
+def add_schagels(amount):
+    def setup(level):
+        with level.commands.deferred():  # added in one batch
+            for _ in range(amount):
+                level.add_character(Schagel((random.randint(0, level.size[0]), level.size[1] / 2), (58, 52)))
+    return setup
+
+
+def throw_vials(per_second):
+    def setup(level):
+        level.player.accesories[Weapon].add_ammo(10 ** 6)
+
+    def step(level, tick):
+        # vials thrown up to this tick, in game time
+        for throw in range(tick * per_second // TICK_RATE, (tick + 1) * per_second // TICK_RATE):
+            level.player.attack((CAMERA_WIDTH if throw % 2 else 0, CAMERA_HEIGHT // 2))  # alternate sides
+    return setup, step
+
+
+def walk(pixels_per_tick, ground=770):
+    def step(level, tick):
+        # carried along the ground, so it doesn't fall into the gaps; streaming levels load segments on the way
+        level.player.rect.midbottom = (100 + tick * pixels_per_tick % (level.size[0] - 200), ground)
+        level.player.y_speed = 0
+    return None, step
+
+
+SCENARIOS = {scenario.name: scenario for scenario in [
+    Scenario('level1_idle', 1),
+    Scenario('level2_schagels_50', 2, add_schagels(50)),
+    Scenario('level2_schagels_200', 2, add_schagels(200)),
+    Scenario('level2_schagels_1000', 2, add_schagels(1000)),
+    Scenario('level1_vials_100_per_second', 1, *throw_vials(100)),
+    Scenario('level3_streaming_walk', 3, *walk(10)),
+]}
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, len(values) * percent // 100)]
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':  # bytes on mac, kilobytes elsewhere
+        peak /= 1024
+    return peak / 1024
+
+
+def run_scenario(scenario, ticks, warmup=BENCHMARK_WARMUP_TICKS, traced=BENCHMARK_TRACED_TICKS,
+                 physics=PHYSICS_BACKEND):
+    """runs a scenario in this process, returns its metrics.
+    The allocations are traced in ticks of their own after the timed ones, tracing slows the ticks down"""
+    random.seed(0)  # the same monsters, at the same places every run
+    pygame.init()
+    level = level_builder(scenario.level_number)
+    level.set_physics_backend(physics)
+    # every tick simulates the same: the player can't die, and the first attack doesn't freeze the level
+    level.player.life_points = float('inf')
+    level.player._first_attack = False
+    if scenario.setup:
+        scenario.setup(level)
+
+    tick_time = 1000 / TICK_RATE
+    times = []
+    for tick in range(warmup + ticks):  # caches, and pools are filled during the warm up
+        start = perf_counter()
+        if scenario.step:
+            scenario.step(level, tick)
+        level.tick(tick_time)
+        if tick >= warmup:
+            times.append((perf_counter() - start) * 1000)
+    peak_rss = peak_rss_mb()  # before tracing, which takes memory of its own
+
+    # what a tick allocates on top of what it started with, the memory freed during the tick doesn't count
+    allocated = 0
+    tracemalloc.start()
+    for tick in range(warmup + ticks, warmup + ticks + traced):
+        tracemalloc.reset_peak()
+        start, _ = tracemalloc.get_traced_memory()
+        if scenario.step:
+            scenario.step(level, tick)
+        level.tick(tick_time)
+        allocated += tracemalloc.get_traced_memory()[1] - start
+    tracemalloc.stop()
+
+    return {'ticks': ticks,
+            'ticks_per_second': ticks / (sum(times) / 1000),
+            'mean_ms': sum(times) / ticks,
+            'p50_ms': percentile(times, 50),
+            'p99_ms': percentile(times, 99),
+            'peak_rss_mb': peak_rss,
+            'alloc_kb_per_tick': allocated / traced / 1024}
+
+
+class EventTarget:
+    """Stands in for the player in the event benchmark, so only the event system is measured"""
+
+    def attack(self, pos):
+        pass
+
+
+def run_event_benchmark(amount=BENCHMARK_EVENTS):
+    """returns the cost per event of constructing it, and of constructing, queueing, and handling it;
+    and the longest frame while a burst of events is handled"""
+    target = EventTarget()
+    start = perf_counter()
+    for _ in range(amount):
+        AttackEvent(attacker=target, pos=(0, 0))
+    construct = perf_counter() - start
+
+    start = perf_counter()
+    with redirect_stdout(io.StringIO()):  # the handler logs every event
+        for _ in range(amount):
+            event_handler.add(AttackEvent(attacker=target, pos=(0, 0)))
+            event_handler.handle_events()
+    dispatch = perf_counter() - start
+
+    frames = []  # milliseconds of handle_events per frame, the budget spreads the burst over frames
+    with redirect_stdout(io.StringIO()):
+        for _ in range(amount):
+            event_handler.add(AttackEvent(attacker=target, pos=(0, 0)))
+        while len(event_handler):
+            start = perf_counter()
+            event_handler.handle_events()
+            frames.append((perf_counter() - start) * 1000)
+    return {'events': amount, 'construct_us': construct / amount * 10 ** 6, 'dispatch_us': dispatch / amount * 10 ** 6,
+            'burst_frames': len(frames), 'burst_max_frame_ms': max(frames)}
+
+
+def run_scenario_process(name, ticks, physics):
+    """runs a scenario in a new process, returns its metrics"""
+    # the result goes to a file of its own, the output of the process is shared with the log writer thread
+    with tempfile.TemporaryDirectory() as directory:
+        result_file = os.path.join(directory, 'result.json')
+        command = [sys.executable, os.path.abspath(__file__), '--run', name, '--ticks', str(ticks), '--physics', physics,
+                   '--result-file', result_file]
+        process = subprocess.run(command, stdout=subprocess.DEVNULL)
+        if not os.path.exists(result_file):
+            raise RuntimeError(f"scenario {name} failed, exit code: {process.returncode}")
+        with open(result_file) as file:
+            text = file.read()
+    try:
+        result, _ = json.JSONDecoder().raw_decode(text.lstrip())  # anything after the result is ignored
+    except ValueError as ex:
+        raise RuntimeError(f"scenario {name} wrote no result: {ex}") from None
+    return result
+
+
+def compare(result, baseline, threshold):
+    """returns (metric, baseline, result, relative change, regressed) for the metrics both have"""
+    rows = []
+    for metric, (higher_is_better, noise) in METRICS.items():
+        old, new = baseline.get(metric), result.get(metric)
+        if old is None or new is None:
+            continue
+        change = (new - old) / abs(old) if old else 0
+        worse = old - new if higher_is_better else new - old
+        regressed = noise is not None and worse > noise and worse > threshold * abs(old)
+        rows.append((metric, old, new, change, regressed))
+    return rows
+
+
+def load_baseline(file_name=BENCHMARK_BASELINE):
+    """physics backend: {scenario: metrics}"""
+    if not os.path.exists(file_name):
+        return {}
+    with open(file_name) as file:
+        return json.load(file)
+
+
+def save_baseline(baseline, file_name=BENCHMARK_BASELINE):
+    with open(file_name, 'w') as file:
+        json.dump(baseline, file, indent=2, sort_keys=True)
+        file.write('\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="scenario benchmarks of the simulation")
+    parser.add_argument('scenarios', nargs='*', help="scenarios to run, all when none are given")
+    parser.add_argument('--ticks', type=int, default=BENCHMARK_TICKS, help="measured ticks per scenario")
+    parser.add_argument('--repeat', type=int, default=BENCHMARK_REPEAT,
+                        help="runs per scenario, the fastest one is kept")
+    parser.add_argument('--physics', choices=PHYSICS_BACKENDS, default=PHYSICS_BACKEND)
+    parser.add_argument('--threshold', type=float, default=BENCHMARK_THRESHOLD,
+                        help="relative change of a metric that counts as a regression")
+    parser.add_argument('--update-baseline', action='store_true', help="store the results as the new baseline")
+    parser.add_argument('--list', action='store_true', help="list the scenarios")
+    parser.add_argument('--run', help=argparse.SUPPRESS)  # runs one scenario in this process
+    parser.add_argument('--result-file', help=argparse.SUPPRESS)  # where --run writes its result
+    arguments = parser.parse_args()
+
+    if arguments.list:
+        print("\n".join(list(SCENARIOS) + [EVENT_BENCHMARK]))
+        return 0
+    if arguments.run:
+        if arguments.run == EVENT_BENCHMARK:
+            result = run_event_benchmark()
+        else:
+            result = run_scenario(SCENARIOS[arguments.run], arguments.ticks, physics=arguments.physics)
+        if arguments.result_file:
+            with open(arguments.result_file, 'w') as file:
+                json.dump(result, file)
+        else:
+            log.flush()  # so no log message ends up on the result line
+            print(RESULT_PREFIX + json.dumps(result), flush=True)
+        return 0
+
+    unknown = [name for name in arguments.scenarios if name not in SCENARIOS and name != EVENT_BENCHMARK]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+    baseline = load_baseline()
+    backend_baseline = baseline.setdefault(arguments.physics, {})
+    regressions = []
+    for name in arguments.scenarios or list(SCENARIOS) + [EVENT_BENCHMARK]:
+        # other processes only ever slow a run down, so the fastest run is the closest to the code's own speed
+        result = min((run_scenario_process(name, arguments.ticks, arguments.physics) for _ in range(arguments.repeat)),
+                     key=lambda result: result.get('mean_ms', result.get('dispatch_us')))
+        print(f"{name}:")
+        old = backend_baseline.get(name)
+        if old is None or arguments.update_baseline:
+            for metric in METRICS:
+                if result.get(metric) is not None:
+                    print(f"  {metric:>26}: {result[metric]:12.2f}")
+        else:
+            if old.get('ticks') != result.get('ticks'):
+                print(f"  baseline ran {old.get('ticks')} ticks, percentiles may not compare")
+            for metric, old_value, value, change, regressed in compare(result, old, arguments.threshold):
+                print(f"  {metric:>26}: {old_value:12.2f} -> {value:12.2f} ({change:+.1%}){' REGRESSION' if regressed else ''}")
+                if regressed:
+                    regressions.append(f"{name} {metric}")
+        if arguments.update_baseline:
+            backend_baseline[name] = result
+
+    if arguments.update_baseline:
+        save_baseline(baseline)
+        print(f"baseline written to: {BENCHMARK_BASELINE}")
+    elif regressions:
+        print(f"{len(regressions)} regressions over {arguments.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,172 @@
+# broadphase collision structures, these only find candidates; the rectangle tests are done by the level
+
+from bisect import bisect_left, bisect_right
+
+
+class SpatialHash:
+    """Uniform grid that buckets game components by the cells their rectangle overlaps.
+    Components are keyed by their id, so a level can query only the components near a rectangle"""
+
+    def __init__(self, cell_size):
+        if cell_size <= 0:
+            raise ValueError(f"cell size has to be positive: {cell_size}")
+        self.cell_size = cell_size
+        self.cells = {}  # (column, row): {component id: component}
+        self.bounds = {}  # component id: (first column, first row, last column, last row)
+
+    def __len__(self):
+        return len(self.bounds)
+
+    def __contains__(self, component):
+        return component.id in self.bounds
+
+    def _bounds(self, rect):
+        size = self.cell_size
+        left, top = rect.left // size, rect.top // size
+        # a rectangle without width or height still occupies the cell of its top-left corner
+        right = max(left, (rect.right - 1) // size)
+        bottom = max(top, (rect.bottom - 1) // size)
+        return int(left), int(top), int(right), int(bottom)
+
+    @staticmethod
+    def _cells(bounds):
+        left, top, right, bottom = bounds
+        for column in range(left, right + 1):
+            for row in range(top, bottom + 1):
+                yield column, row
+
+    def insert(self, component):
+        if component.id in self.bounds:
+            self.remove(component)
+        bounds = self._bounds(component.rect)
+        self.bounds[component.id] = bounds
+        for cell in self._cells(bounds):
+            self.cells.setdefault(cell, {})[component.id] = component
+
+    def remove(self, component):
+        bounds = self.bounds.pop(component.id, None)
+        if bounds is None:
+            return
+        for cell in self._cells(bounds):
+            bucket = self.cells[cell]
+            del bucket[component.id]
+            if not bucket:  # empty cells are dropped, so the grid only grows with the occupied area
+                del self.cells[cell]
+
+    # re-buckets a component after it moved; untracked components are ignored
+    def update(self, component):
+        old_bounds = self.bounds.get(component.id)
+        if old_bounds is None:
+            return
+        if old_bounds != self._bounds(component.rect):
+            self.remove(component)
+            self.insert(component)
+
+    def query(self, rect):
+        """returns all components in the cells that overlap rect, without duplicates, ordered by id"""
+        found = {}
+        for cell in self._cells(self._bounds(rect)):
+            bucket = self.cells.get(cell)
+            if bucket:
+                found.update(bucket)
+        return [found[component_id] for component_id in sorted(found)]
+
+    def clear(self):
+        self.cells.clear()
+        self.bounds.clear()
+
+
+class GroundIndex:
+    """Static components sorted on the left side of their rectangle, with a tree of the largest right side per range.
+    The rectangles must not move after being indexed; a lookup is a binary search for the components starting before
+    the right of the rectangle, and a descent into the ranges that reach past its left, so one wide floor doesn't
+    make every lookup scan the index"""
+
+    # presorted components are already in (left, id) order, e.g. by the level compiler
+    def __init__(self, components=(), presorted=False):
+        if not presorted:
+            components = sorted(components, key=lambda component: (component.rect.left, component.id))
+        components = list(components)
+        self.keys = [(component.rect.left, component.id) for component in components]
+        self.components = components
+        self._build()
+
+    def __len__(self):
+        return len(self.components)
+
+    # rights[node] is the largest right side under the node; leaves start at self.leaves, node 1 is the root
+    def _build(self):
+        self.leaves = 1
+        while self.leaves < len(self.components):
+            self.leaves *= 2
+        rights = [float('-inf')] * (2 * self.leaves)
+        rights[self.leaves:self.leaves + len(self.components)] = [component.rect.right
+                                                                   for component in self.components]
+        for node in range(self.leaves - 1, 0, -1):
+            rights[node] = max(rights[2 * node], rights[2 * node + 1])
+        self.rights = rights
+
+    # inserting is rare (components added while the level is played), the tree is built again
+    def insert(self, component):
+        key = (component.rect.left, component.id)
+        position = bisect_right(self.keys, key)
+        self.keys.insert(position, key)
+        self.components.insert(position, component)
+        self._build()
+
+    def query(self, rect):
+        """returns the components which overlap rect on the x-axis, ordered by id"""
+        last = bisect_left(self.keys, (rect.right, -1))  # the components that start left of rect.right
+        left, rights, leaves = rect.left, self.rights, self.leaves
+        found = []
+        stack = [(1, 0, leaves)] if last else []  # node, and the range of positions under it
+        while stack:
+            node, start, end = stack.pop()
+            if rights[node] <= left:  # nothing under it reaches rect
+                continue
+            if node >= leaves:
+                found.append(self.components[start])
+                continue
+            middle = (start + end) // 2
+            if middle < last:
+                stack.append((2 * node + 1, middle, end))
+            stack.append((2 * node, start, middle))
+        found.sort(key=lambda component: component.id)
+        return found
+
+
+class SegmentedGroundIndex:
+    """The ground indices of the loaded segments of a streaming level, queried as one.
+    A component that overlaps multiple segments is in the index of each of them"""
+
+    def __init__(self, segment_width):
+        self.segment_width = segment_width
+        self.segments = {}  # segment index: GroundIndex
+
+    def __len__(self):
+        return len({component.id for index in self.segments.values() for component in index.components})
+
+    def add(self, segment, index):
+        self.segments[segment] = index
+
+    def remove(self, segment):
+        self.segments.pop(segment, None)
+
+    def _segments(self, rect):
+        first = rect.left // self.segment_width
+        return range(first, max(first, (rect.right - 1) // self.segment_width) + 1)
+
+    # into the indices of the loaded segments it overlaps
+    def insert(self, component):
+        for segment in self._segments(component.rect):
+            if segment in self.segments:
+                self.segments[segment].insert(component)
+
+    def query(self, rect):
+        """returns the components in the loaded segments which overlap rect on the x-axis, ordered by id"""
+        found = {}
+        for segment in self._segments(rect):
+            index = self.segments.get(segment)
+            if index is not None:
+                found.update((component.id, component) for component in index.query(rect))
+        return [found[component_id] for component_id in sorted(found)]
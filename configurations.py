@@ -11,10 +11,58 @@ WINDOW_WIDTH = -1
 WINDOW_HEIGHT = -1
 RESOLUTION = (WINDOW_WIDTH, WINDOW_HEIGHT)
 
-# output levels
-WARNING = True
-INFO = True
-DEBUG = False # too much information
-PHYSICS_DEBUG = False
-GRAPHICS_DEBUG = False
-PLAYER_DEBUG = True
\ No newline at end of file
+# resources
+RESOURCE_CACHE_SIZE = 32 * 1024 * 1024  # bytes of decoded surfaces that are kept in memory
+RESOURCE_DECODE_WORKERS = None  # threads decoding PNG files at once; None: a few more than there are cores
+SPRITE_CACHE_SIZE = 16 * 1024 * 1024  # bytes of scaled, flipped, and rotated resources that are kept in memory
+ASSET_PACK = 'resources.pack'  # decoded resources, built by pack_assets.py; without it the PNG files are decoded
+
+# simulation
+TICK_RATE = 30  # physics, and collision ticks per second; independent of the frame rate
+MAX_TICKS_PER_FRAME = 5  # after a slow frame the simulation drops time, instead of catching up forever
+PHYSICS_BACKEND = 'scalar'  # 'scalar', or 'numpy' (vectorized, needs numpy)
+POOL_SIZE = 256  # released components kept per type for reuse
+
+# rendering
+DIRTY_RECT_RENDERING = False  # only redraw, and update the parts of the screen that changed
+TEXT_FONT = "Ariel"  # font family of texts, and meters
+TEXT_CACHE_SIZE = 512  # rendered lines of text kept for reuse, the least recently used are dropped
+
+# frame profiler
+PROFILER_HISTORY = 300  # frames kept for the percentiles
+PROFILER_OVERLAY_INTERVAL = 15  # frames between overlay updates
+
+# level loading
+LEVEL_DATA_DIR = 'level_data'  # level files
+COMPILED_LEVEL_DIR = 'level_data/compiled'  # compiled level files, these are built when needed
+LEVEL_PREFETCH_PROGRESS = 0.5  # part of a level that's finished when the next level starts building
+LEVEL_SEGMENT_RADIUS = 1  # segments of a streaming level that are loaded on both sides of the camera
+
+# events
+EVENT_BUDGET_MS = 4  # time per frame for handling game events, the rest is handled in the next frame
+EVENT_QUEUE_SIZE = 10000  # events waiting at most, newer events are disposed
+EVENT_METRICS_HISTORY = 300  # queue depths, and dispatch latencies kept for the event statistics
+
+# benchmarks (benchmark.py)
+BENCHMARK_TICKS = 600  # measured ticks per scenario
+BENCHMARK_WARMUP_TICKS = 30  # ticks before measuring
+BENCHMARK_TRACED_TICKS = 100  # ticks of which the allocations are traced, after the timed ticks
+BENCHMARK_REPEAT = 3  # runs per scenario, the fastest is compared
+BENCHMARK_EVENTS = 10000  # events created, and handled by the event microbenchmark
+BENCHMARK_THRESHOLD = 0.2  # a metric 20% worse than the baseline is a regression
+BENCHMARK_BASELINE = 'benchmark_baseline.json'
+
+# level background
+BACKGROUND_TILE_SIZE = 256  # width, and height of a background tile in pixels
+BACKGROUND_PREFETCH_MARGIN = 256  # pixels around the camera of which the background tiles are kept composited
+BACKGROUND_SCALE_PADDING = 2  # source pixels scaled around the part of a stretched layer that's in a tile
+BACKGROUND_SCALE_ALIGNMENT = 16  # source pixels the padding can grow by, to line the part up with the whole layer
+BACKGROUND_CHECK_TOLERANCE = 16  # largest colour difference between the tiles, and one scaling (level_compiler --check)
+
+# collision detection
+COLLISION_CELL_SIZE = 128  # default cell size (in pixels) of a level's spatial hash
+
+# logging (log.py), levels: 'debug', 'info', 'warning', 'error', or 'off'; they can be changed while the game runs
+LOG_LEVEL = 'info'  # level of the categories that don't have their own
+LOG_LEVELS = {'physics': 'info', 'graphics': 'info', 'player': 'info'}  # debug is per tick, see main.py --log
+LOG_BUFFER_SIZE = 10000  # messages waiting to be written, the oldest are dropped when the writer can't keep up
@@ -1,50 +1,102 @@
-from queue import Queue, Full
-from threading import Thread
-from time import sleep
+from collections import deque
+from time import perf_counter
 
+from log import get_logger
 from configurations import *
 
+logger = get_logger('events')
 
-class EventHandler(Queue, Thread):
-    def __init__(self):
-        super(EventHandler, self).__init__()
-        Thread.__init__(self)
+# event priorities, lower is handled first
+PRIORITY_INPUT = 0  # the player's movement, and attacks
+PRIORITY_GAME = 1  # changes to the game state
+PRIORITY_LOW = 2  # texts, and spawning
+PRIORITIES = 3
 
-    # adds
+
+class EventHandler:
+    """Queues game events per priority, and handles them on the main thread within a time budget per frame.
+    Events that don't fit in the budget are carried over to the next frame"""
+
+    def __init__(self, budget=EVENT_BUDGET_MS, max_size=EVENT_QUEUE_SIZE):
+        self.budget = budget  # milliseconds per handle_events call
+        self.max_size = max_size
+        self.queues = [deque() for _ in range(PRIORITIES)]  # priority: (event, time it was added)
+        self.size = 0
+        # metrics
+        self.depths = deque(maxlen=EVENT_METRICS_HISTORY)  # events left after the last handle_events calls
+        self.latencies = deque(maxlen=EVENT_METRICS_HISTORY)  # milliseconds between adding, and handling an event
+        self.handled = 0
+        self.dropped = 0
+        self.carried = 0  # handle_events calls that ran out of budget
+
+    def __len__(self):
+        return self.size
+
+    def __repr__(self):
+        return "events: " + ", ".join(f"{name}: {value}" for name, value in self.statistics().items())
+
+    def empty(self):
+        return self.size == 0
+
+    # default behaviour is to dispose of the event when the queue is full
     def add(self, event):
-        try:
-            if INFO:
-                print("[G] event added: {}".format(event.TYPE))
-            self.put_nowait(event)
-            # default behaviour is to dispose of the event when the queue is full
-        except Full:
-            if WARNING:
-                print("[!] warning, event queue is full, event disposed: {}".format(event.TYPE))
-
-    def handle_events(self):
-        if self.qsize() < 10:
-            while not self.empty():
-                event = self.get()
-                event.handle()
-        elif 20 < self.qsize() >= 10:
-            if WARNING:
-                print("[!]queue is 10 items or more large")
-            for _ in range(10):
-                event = self.get()
-                event.handle()
-        else:
-            if WARNING:
-                print("[!]queue seems to get big, add queue handling code")
-            while not self.empty():
-                event = self.get()
-                event.handle()
-
-    def run(self):
-        self.running = True
-        while self.running:
-            while not self.has_event():
-                sleep(0.1)
-            else:
-                self.handle_game_events()
-
-event_handler = EventHandler()
\ No newline at end of file
+        if self.size >= self.max_size:
+            self.dropped += 1
+            logger.warning("event queue is full, event disposed: {}", event.TYPE)
+            return False
+        logger.debug("event added: {}", event.TYPE)
+        self.queues[event.PRIORITY].append((event, perf_counter()))
+        self.size += 1
+        return True
+
+    def _pop(self):
+        for queue in self.queues:
+            if queue:
+                self.size -= 1
+                return queue.popleft()
+
+    def handle_events(self, budget=None):
+        """handles events, highest priority first, until the queue is empty or the budget (milliseconds) is used up;
+        at least one event is handled, so the queue always drains. Returns the amount of handled events"""
+        if budget is None:
+            budget = self.budget
+        deadline = perf_counter() + budget / 1000
+        handled = 0
+        while self.size:
+            event, added = self._pop()  # events added while handling are picked up by priority too
+            event.handle()
+            now = perf_counter()
+            self.latencies.append((now - added) * 1000)
+            handled += 1
+            if now >= deadline:
+                break
+        if self.size:
+            self.carried += 1
+            logger.debug("event budget used up, {} events carried to the next frame", self.size)
+        self.handled += handled
+        self.depths.append(self.size)
+        return handled
+
+    def handle_all(self):
+        """handles every event, regardless of the budget (loading, or tools)"""
+        return self.handle_events(float('inf'))
+
+    @staticmethod
+    def _percentile(values, percent):
+        values = sorted(values)
+        if not values:
+            return 0
+        return values[min(len(values) - 1, len(values) * percent // 100)]
+
+    def statistics(self):
+        """queue depth, and dispatch latency (milliseconds) over the last handle_events calls, and totals"""
+        return {'depth': self.size,
+                'max_depth': max(self.depths, default=0),
+                'latency_p50': round(self._percentile(self.latencies, 50), 3),
+                'latency_p99': round(self._percentile(self.latencies, 99), 3),
+                'handled': self.handled,
+                'dropped': self.dropped,
+                'carried': self.carried}
+
+
+event_handler = EventHandler()
@@ -1,43 +1,62 @@
-from threading import Thread
-
+from event_handling import PRIORITY_INPUT, PRIORITY_GAME, PRIORITY_LOW
 from game_components import Text, create_game_component
-from levels import level_builder
+from pool import component_pool
+from levels import level_loader
+from log import get_logger
 from configurations import *
 
-class GameEvent(Thread):
-    def __init__(self, **data):
-        super(GameEvent, self).__init__()
-        self.event_name = self.TYPE
-        self.data = data
+logger = get_logger('events')
+
+
+class EventType(type):
+    """Builds the __slots__ of an event class from the FIELDS it declares;
+    ALL_FIELDS holds the fields of the class, and the classes it inherits from"""
 
-    def __getattr__(self, name):
-        try:
-            return self.data[name]
-        except:
-            pass
+    def __new__(mcs, name, bases, namespace):
+        fields = tuple(namespace.get('FIELDS', ()))
+        namespace['__slots__'] = fields
+        cls = super().__new__(mcs, name, bases, namespace)
+        cls.ALL_FIELDS = tuple(field for base in bases for field in getattr(base, 'ALL_FIELDS', ())) + fields
+        return cls
+
+
+class GameEvent(metaclass=EventType):
+    """An action for the game state that is handled later on, by the event handler.
+    Every event type declares its FIELDS, which are passed as keywords; fields that aren't passed are None"""
+    TYPE = 'GameEvent'
+    FIELDS = ()
+    PRIORITY = PRIORITY_GAME
+
+    def __init__(self, **data):
+        for field in self.ALL_FIELDS:
+            setattr(self, field, data.pop(field, None))
+        if data:
+            raise TypeError(f"{self.TYPE} event has no fields: {', '.join(data)}")
 
-    def __del__(self):
-        if INFO:
-            print("[EV] handled: {} with data: {}".format(self.TYPE, self.data))
+    def __repr__(self):
+        return "{}({})".format(self.TYPE, ", ".join(f"{field}={getattr(self, field)!r}" for field in self.ALL_FIELDS))
 
     def handle(self):
         raise NotImplementedError("Please implement this method")
 
-    def run(self):
-        return self.handle()
 
 class LoadLevelEvent(GameEvent):
-    """loads a image using Level.level_builder"""
+    """switches to a level built by the level loader; it's only waited for when it wasn't prefetched"""
     TYPE = 'LoadLevel'
+    FIELDS = ('level', 'game_state')
 
     def handle(self):
-        # create new image, and add it to the game state
-        self.game_state.level = level_builder(self.level)  # new image
-        self.game_state.input.set_player(self.game_state.level.player)  # adds initialized player to input handler
+        level = level_loader.take(self.level)
+        level.activate()
+        self.game_state.level = level  # new image
+        self.game_state.loading_level = None
+        self.game_state.input.set_player(level.player)  # adds initialized player to input handler
 
 
 class AttackEvent(GameEvent):
     TYPE = 'ATTACK'
+    FIELDS = ('attacker', 'pos')
+    PRIORITY = PRIORITY_INPUT
 
     def handle(self):
         self.attacker.attack(self.pos)
@@ -45,23 +64,22 @@ class AttackEvent(GameEvent):
 
 class AddTextEvent(GameEvent):
     TYPE = 'ADDTEXT'
+    FIELDS = ('level', 'text', 'pos', 'size')
+    PRIORITY = PRIORITY_LOW
 
     def handle(self):
-        c = []
-        for x in self.level.components:
-            if type(x) == Text:
-                c.append(x.text)
-        if self.text in c:
-            if DEBUG:
-                print('text already present')
+        if self.level.registry.find_text(self.text) is not None:
+            logger.debug("text already present: {}", self.text)
             return
-        text = Text(self.text, self.pos, self.size)
+        text = component_pool.acquire(Text, self.text, self.pos, self.size)
         self.level.add_component(text)
 
 
 # movement events are a bad design idea, but right now necessary
 class MoveEvent(GameEvent):
     TYPE = 'MOVE'
+    FIELDS = ('player', 'movement')
+    PRIORITY = PRIORITY_INPUT
 
     def handle(self):
         self.player.throw(self.movement)
@@ -70,6 +88,8 @@ class MoveEvent(GameEvent):
 # probably not needed
 class StopMoveEvent(GameEvent):
     TYPE = 'StopMove'
+    FIELDS = ('player', 'movement')
+    PRIORITY = PRIORITY_INPUT
 
     def handle(self):
         self.player.stop_move(self.movement)
@@ -77,12 +97,15 @@ class StopMoveEvent(GameEvent):
 
 class GroundCollisionEvent(GameEvent):
     TYPE = 'GroundCollission'
+    FIELDS = ('entity', 'ground')
 
     def handle(self):
         self.entity.set_ground(self.ground)
 
 class NewMonsterEvent(GameEvent):
     TYPE = 'NewMonster'
+    FIELDS = ('type', 'pos', 'size', 'level')
+    PRIORITY = PRIORITY_LOW
 
     def handle(self):
         monster = create_game_component(self.type, self.pos, size=self.size)
@@ -90,23 +113,20 @@ class NewMonsterEvent(GameEvent):
 
 class DelGameComponentEvent(GameEvent):
     TYPE = 'DelGameComponent'
+    FIELDS = ('level', 'component')
 
     def handle(self):
-        try:
-            del self.level.components[self.level.components.index(self.component)]
-        except ValueError as ex:
-            if WARNING:
-                print(f"[EV] component couldn't be deleted: {self.component}")
-        del self.level.dynamic_components[self.level.dynamic_components.index(self.component)]
+        self.level.del_component(self.component)  # keeps the level's lists, and spatial hash consistent
 
 
 
-EVENTS = [LoadLevelEvent, AttackEvent, AddTextEvent, MoveEvent, StopMoveEvent, GroundCollisionEvent, NewMonsterEvent,
-          DelGameComponentEvent]
+# event TYPE: event class
+EVENTS = {event.TYPE: event for event in [LoadLevelEvent, AttackEvent, AddTextEvent, MoveEvent, StopMoveEvent,
+                                          GroundCollisionEvent, NewMonsterEvent, DelGameComponentEvent]}
 
 
 def create_game_event(_type, **data):
-    return EVENTS[_type](data)
+    return EVENTS[_type](**data)
 
 # game_events = {name: GameEvent(name) for name, handler in {'attack':None, 'init_level': None}.values()}
 
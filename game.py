@@ -17,16 +17,21 @@
 # Monster's walk towards player, possibly replace with AI
 
 import sys
-from queue import Full
-from time import sleep
+from time import perf_counter
 
 import pygame
 from pygame.locals import *
 
 from events import *
 from game_components import *
+from levels import level_loader
+from profiler import profiler
+from log import get_logger
 from configurations import *
 
+logger = get_logger('game')
+input_logger = get_logger('input')
+
 
 # Input (keys, mouse)
 class InputHandler:
@@ -50,19 +55,17 @@ class InputHandler:
     def move(self, movement):
         if self.player is not None:
             self.player.move(movement)
-            if DEBUG: print(f"[IO] {self.player} moved: {movement}")
+            input_logger.debug("{} moved: {}", self.player, movement)
         else:
-            if WARNING:
-                print("[IO] movement handled while no player selected: {movement}!")
+            input_logger.warning("movement handled while no player selected: {}!", movement)
 
     # generates a stop throw event
     def stop_move(self, movement):
         if self.player is not None:
             self.player.stop_move(movement)
-            if DEBUG: print(f"[IO] {self.player} stopped moving:: {movement}")
+            input_logger.debug("{} stopped moving: {}", self.player, movement)
         else:
-            if WARNING:
-                print("[IO] movement handled while no player selected: {movement}!")
+            input_logger.warning("movement handled while no player selected: {}!", movement)
 
     # key group handling
     # Every key group has a relevant function
@@ -73,8 +76,7 @@ class InputHandler:
             elif id in self.action_keys:  # player actions
                 event_handler.add(self.action_keys[id])
         else:
-            if DEBUG:
-                print("[IO] Event handled while no player selected, event discarded!")
+            input_logger.debug("event handled while no player selected, event discarded!")
 
     def press(self, id):
         self.handle_key(id)
@@ -113,6 +115,10 @@ class InputHandler:
                 self.game_state.init_level(1)
             elif event.key == K_f:
                 self.game_state.level.freeze = not self.game_state.level.freeze
+            elif event.key == K_p:  # frame profiler overlay
+                profiler.toggle_overlay()
+            elif event.key == K_c:  # start, or stop writing frame times to a csv file
+                profiler.toggle_csv()
         # when a key is released, in some casescreate an event
         elif event.type == KEYUP:  # something to handle seperate key pressing and releasing
             if event.key == K_a:  # left
@@ -149,7 +155,9 @@ class Game:
         self.active_game_components = []  # can be used to hold all on-screen game components for optimization
         # self.load_game_components()
         self.level = None
-        self.meters ={'fps': None, 'player_health': None, 'kills_left':None}
+        self.loading_level = None  # the level number of a LoadLevelEvent that wasn't handled yet
+        self.frames_per_time = 0
+        self.hud = Hud()  # fps, kills, and health meters
 
     def load_resources(self):
         self.init_sound()
@@ -160,8 +168,9 @@ class Game:
     # save, and unload game
     @staticmethod
     def de_init():
+        profiler.stop_csv()
         pygame.quit()
-        print("[Ga] de-init completed!")
+        logger.info("de-init completed!")
         sys.exit()
 
     # load a song, ready for playing
@@ -169,41 +178,22 @@ class Game:
         self.music = None
         try:
             self.music = pygame.mixer.Sound(Game.SOUND_RESOURCE)
-        except pygame.error:
-            if WARNING:
-                print("[!]Sound didn't load!")
+        except (pygame.error, FileNotFoundError):
+            logger.warning("sound didn't load!")
 
     def init_level(self, level_number):
-        print(level_number)
-        self.add_game_event(LoadLevelEvent(level=level_number, game_state=self))  # build, and load image
-        sleep(1)
+        logger.info("loading level {}", level_number)
+        level_loader.prefetch(level_number)  # nothing to do when it's prefetched already
+        self.loading_level = level_number
+        self.add_game_event(LoadLevelEvent(level=level_number, game_state=self))  # switch to it
 
     # Event system
     def add_game_event(self, event):
-        try:
-            event_handler.add(event)
-        except Full:
-            if WARNING:
-                print("[Ga] Event queue is full, event disposed: {}".format(event.TYPE))
+        event_handler.add(event)
 
-    # handle event amount proportional to the amount of events in queue, alternatively thread it
+    # events are handled by priority within a time budget, the rest waits for the next frame
     def handle_game_events(self):
-        if event_handler.qsize() < 10:
-            while not event_handler.empty():
-                event = event_handler.get()
-                event.handle()
-        elif 20 < event_handler.qsize() >= 10:
-            if WARNING:
-                print("[!]queue is 10 items or more large")
-            for _ in range(10):
-                event = event_handler.get()
-                event.handle()
-        else:
-            if WARNING:
-                print("[!]queue seems to get big, add queue handling code")
-            while not event_handler.empty():
-                event = event_handler.get()
-                event.handle()
+        event_handler.handle_events()
 
     # start menu, currently sends you directly into the game
     def launch(self):
@@ -222,72 +212,110 @@ class Game:
         # load the first level
         self.init_level(level_number)
 
+        self.init_hud()
+
         self.running = True
         loop_counter = 0
-        frames_per_time = 0
         dt = [0]*15
+        tick_time = 1000 / TICK_RATE  # milliseconds of game time simulated per tick
+        accumulator = 0  # real time that has not been simulated yet
         while self.running:
             if self.level:
-                if self.level.check_level_finished():
+                if self.level.progress() >= LEVEL_PREFETCH_PROGRESS:  # built while the level is finished
+                    level_loader.prefetch(level_number + 1)
+                # the load event can be carried over to the next frame, the level stays finished until it's handled
+                if self.loading_level is None and self.level.check_level_finished():
                     level_number += 1
                     self.init_level(level_number)
             # Input mechanics
-            for event in pygame.event.get():
-                self.input.handle_pygame_event(event)
-            event_handler.handle_events()  # calls '.handle()' on (almost) every game event in queue
-
-            # graphics processing
-            if self.level is not None:
-                self.level.display()
+            with profiler.phase('input'):
+                for event in pygame.event.get():
+                    self.input.handle_pygame_event(event)
+            with profiler.phase('events'):
+                self.handle_game_events()
 
             # time betweem frames
-            dt[loop_counter] = self.clock.tick(Game.FPS)  # returns the elapsed time in milliseconds
+            with profiler.phase('wait'):
+                dt[loop_counter] = self.clock.tick(Game.FPS)  # returns the elapsed time in milliseconds
 
-            # update game components that aren't part of the image
-            for component in self.active_game_components:
-                component.update(dt[loop_counter])
-            for component in self.meters.values():
-                if component is not None:
-                    component.display()
+            # game mechanics
+            # the simulation runs in fixed ticks, so it behaves the same at every frame rate
+            accumulator += dt[loop_counter]
+            ticks = 0
+            while accumulator >= tick_time and ticks < MAX_TICKS_PER_FRAME:
+                self.level.tick(tick_time)  # detect world, and character collisions, and update (milliseconds)
+                accumulator -= tick_time
+                ticks += 1
+            if ticks == MAX_TICKS_PER_FRAME:
+                accumulator = min(accumulator, tick_time)
 
-            # update display on screen
-            pygame.display.update()
+            # graphics processing
+            # components are drawn between their last two ticks, by the fraction of a tick not simulated yet
+            with profiler.phase('display'):
+                if self.level is not None:
+                    self.level.display(accumulator / tick_time)
+
+                # update game components that aren't part of the image
+                for component in self.active_game_components:
+                    component.update(dt[loop_counter])
+                if self.level:
+                    self.hud.update(dt[loop_counter])
+                self.hud.display()
+                profiler.display()
 
-            # game mechanics
-            # update game components with delta time
-            # todo: make the physics simulation take into account the time till the frame is displayed
-            self.level.detect_collisions()  # detect world, and character collisions
-            self.level.update(dt[loop_counter])  # milliseconds
-            #  detect collisions
+            # update display on screen
+            with profiler.phase('present'):
+                self.graphics.update()
+            profiler.end_frame()
 
 
             loop_counter += 1  # how many loops have been made
             # FPS
             if loop_counter == len(dt):  # print and start over every 15 frames
-                frames_per_time = ((len(dt)/sum(dt))*1000)
-                time_per_frames = 1/frames_per_time
-                print((len(dt)/sum(dt)))
-                if DEBUG:
-                    print("[G] TPF: {}\t FPS: {}".format(time_per_frames, frames_per_time))
+                self.frames_per_time = ((len(dt)/sum(dt))*1000)
+                time_per_frames = 1/self.frames_per_time
+                logger.debug("TPF: {}, FPS: {}", time_per_frames, self.frames_per_time)
+                logger.debug("{}", event_handler)
                 loop_counter = 0
-                # todo: don't put this here!
-            if self.level:
-                self.meters['fps'] = Text(f'FPS: {int(frames_per_time)}',
-                                                        pos=(CAMERA_WIDTH - 200, 10), size=(200, 200), max_time=-1)
-                self.meters['kills_left'] = Text(f'kills left: : {max(int(self.level.killed_monster-8),0)}',
-                                                 pos=(10, 20), size=(200, 200), max_time=-1)
-                if self.level.player:
-                    self.meters['player_health'] = Text(f'HEALTH: {int(self.level.player.life_points)}',
-                                              pos=(10, 100), size=(200, 200), max_time=-1)
+
+    # simulation only, for soak tests, and benchmarks on machines without a display
+    def run_headless(self, level_number, ticks):
+        """runs the ticks of a level as fast as possible, without rendering; returns the ticks per second"""
+        self.add_game_event(LoadLevelEvent(level=level_number, game_state=self))
+        event_handler.handle_all()
+        tick_time = 1000 / TICK_RATE  # the game time of a tick stays the same, only the real time is skipped
+        start = perf_counter()
+        for _ in range(ticks):
+            event_handler.handle_events()
+            self.level.tick(tick_time)
+            profiler.end_frame()
+        elapsed = perf_counter() - start
+        ticks_per_second = ticks / elapsed if elapsed else float('inf')
+        p50, _, p99 = profiler.percentiles('frame')
+        logger.info("headless: {} ticks of level {} in {:.2f}s, {:.0f} ticks/s (last {} ticks: p50 {:.2f} ms, p99 {:.2f} ms)",
+                    ticks, level_number, elapsed, ticks_per_second, min(ticks, profiler.history), p50, p99)
+        return ticks_per_second
+
+    # the meters read the game state every frame, they're only rendered again when their text changed
+    def init_hud(self):
+        if len(self.hud):
+            return
+        self.hud.add('fps', lambda: int(self.frames_per_time), (CAMERA_WIDTH - 200, 10), 'FPS: {}')
+        self.hud.add('kills_left', lambda: max(self.level.KILLS_TO_FINISH - self.level.killed_monster, 0), (10, 20),
+                     'kills left: {}')
+        self.hud.add('player_health', self.player_health, (10, 100), 'HEALTH: {}')
+
+    def player_health(self):
+        player = self.level.player
+        return int(player.life_points) if player else 0
 
 
 
     def test(self):
         """function for testing pygame things"""
-        for component in self.level.components:
-            if type(component) == Text:
-                self.add_game_event(DelGameComponentEvent(level=self.level, component=component))
-                break
+        for component in self.level.registry.texts:
+            self.add_game_event(DelGameComponentEvent(level=self.level, component=component))
+            break
 
 def display_level(level_n):
     input_handler = InputHandler()
@@ -299,7 +327,7 @@ def display_level(level_n):
     t = Temp()
     t.input = input_handler
     event_handler.add(LoadLevelEvent(level=level_n, game_state=t))
-    event_handler.get().handle()
+    event_handler.handle_all()
     level = t.level
     print('background size: {}'.format(level.rect.bottomleft))
 
@@ -310,16 +338,14 @@ def display_level(level_n):
         for event in pygame.event.get():
             input_handler.handle_pygame_event(event)
 
-        while not event_handler.empty():
-            event = event_handler.get()
-            event.handle()
+        event_handler.handle_events()
 
         # graphics processing
         if level is not None:
             level.display()
         # time betweem frames
         # display after waiting for fps time passed
-        pygame.display.flip()
+        graphics_controller.update()
 
 def display_level1(level_n):
     input_handler = InputHandler()
@@ -330,7 +356,7 @@ def display_level1(level_n):
     t = Temp()
     t.input = input_handler
     event_handler.add(LoadLevelEvent(level=level_n, game_state=t))
-    event_handler.get().handle()
+    event_handler.handle_all()
     level = t.level
     print('background size: {}'.format(level.rect.bottomleft))
 
@@ -341,14 +367,12 @@ def display_level1(level_n):
         for event in pygame.event.get():
             input_handler.handle_pygame_event(event)
 
-        while not event_handler.empty():
-            event = event_handler.get()
-            event.handle()
+        event_handler.handle_events()
 
         # graphics processing
         if level is not None:
             level.display()
         # time betweem frames
         # display after waiting for fps time passed
-        pygame.display.flip()
+        graphics_controller.update()
 
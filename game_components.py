@@ -1,13 +1,19 @@
 # graphical, and level components which can be used together to make a world in which you can play (and learn)
 
-import time
+import itertools
 
 import pygame
 
 from event_handling import event_handler
-from graphics import controller as graphics_controller
+from pool import component_pool
+from graphics import controller as graphics_controller, interpolate_rect
+from log import get_logger
 from configurations import *
 
+logger = get_logger('components')
+physics_logger = get_logger('physics')
+player_logger = get_logger('player')
+
 GAME_SPEED = 0.033  # seconds per frame (1s/30fps)
 GRAVITY = 6
 
@@ -46,10 +52,14 @@ class PhysicsEntity:
         self._dy = 0
         self.x_movement = False
         self.jumping = False
+        self.integrated = False  # set when a vectorized physics backend already moved the entity this tick
 
     # moves the entity, this changes the rectangle
     # relies on delta time
     def physics_movement(self, dt):  # todo: rewrite with Newtonian physics
+        if self.integrated:
+            self.integrated = False
+            return
         # ground should be checked/set before this method is called
         if not self.jumping:
             if self.ground is not None and not (self.x_accel or self.x_speed or self.y_accel or self.y_speed):
@@ -81,7 +91,7 @@ class PhysicsEntity:
         if self.jumping:
             if self.ground:
                 self.y_speed = -self.JUMP_SPEED  # if jumping set speed directly at once
-                print("DB JUMP!")
+                physics_logger.debug("{} jumps", self)
             else:
                 if self.y_speed < 0:  # going up
                     self.y_speed += GRAVITY * (dt / 60)
@@ -97,22 +107,27 @@ class PhysicsEntity:
         dx, dy = self.x_speed, self.y_speed
 
         self.rect.move_ip(dx, dy)
+        self._moved()
+
+        physics_logger.debug("{!r} speed:({}, {}), accel:({}, {}), movement:({}, {})", self, self.x_speed, self.y_speed,
+                             self.x_accel, self.y_accel, dx, dy)
 
-        if PHYSICS_DEBUG:
-            print(f"[PE] {repr(self)} speed:({(self.x_speed)}, {(self.y_speed)}), accel:({(self.x_accel)}, {(self.y_accel)})")
-            print(f"[PE] movement:({dx}, {dy})")
+    # keeps the level's broadphase up to date; has to be called whenever the rectangle changed
+    def _moved(self):
+        level = getattr(self, 'level', None)
+        if level is not None:
+            level.spatial_hash.update(self)
 
 
 class GraphicsComponent(pygame.sprite.Sprite):
     """Base class for all Graphical Game Components"""
 
-    id = 0
+    ids = itertools.count()  # thread safe, components are also created by the level loader
 
     def __init__(self, pos, size=None):
         pygame.sprite.Sprite.__init__(self)
         # create an ID for  every graphical object
-        self.id = self.__class__.id
-        GraphicsComponent.id += 1  # increment class identifier for the next
+        self.id = next(GraphicsComponent.ids)
         self.graphics_controller = graphics_controller  # graphics controller so components can take care of blitting
         self._find_resource()  # automatically searches for the appropriate surfaces that go with the component
         # use image size if no size is specified
@@ -123,32 +138,25 @@ class GraphicsComponent(pygame.sprite.Sprite):
         # prepare image (size, alpha channel, etc.)
         self._init_image()
         self.rect = pygame.Rect(pos, self.size)  # a rectangle which represents it's position in the level
-        # DEBUG information
-        if INFO:
-            print("[GC] New Game Component '{}', ID: {}, pos: ({}, {}), size: ({}, {})".format(self.TYPE, self.id,
-                                                                                               *self.rect))
+        logger.debug("new game component '{}', ID: {}, pos: ({}, {}), size: ({}, {})", self.TYPE, self.id, *self.rect)
     def __eq__(self, other):
         return self.id == other.id
 
     def __repr__(self):
         return str(self.id)
 
-    # todo: add logging code
     def __del__(self):
         try:
-            if INFO:
-                print("[GC] Dead Game Component '{}', ID: {}, pos: ({}, {}), size: ({}, {})".format(self.TYPE,
-                                                                                                    self.id,
-                                                                                                    *self.rect))
+            logger.debug("dead game component '{}', ID: {}, pos: ({}, {}), size: ({}, {})", self.TYPE, self.id,
+                         *self.rect)
         except AttributeError as ex:
-            print("[GC] '{}' not initialized right!".format(self.TYPE))
-            print(ex)
+            logger.warning("'{}' not initialized right: {}", self.TYPE, ex)
 
     def _find_resource(self):
-        try:
-            self.resource = self.graphics_controller.resources[self.TYPE.lower()]  # search for image by type name
-        except Exception:
-            self.resource = self.graphics_controller.resources[self.TYPE.lower()[:-11]] # search for image by type name
+        self.resource_name = self.TYPE.lower()  # search for image by type name
+        if self.resource_name not in self.graphics_controller.resources:
+            self.resource_name = self.resource_name[:-11]
+        self.resource = self.graphics_controller.resources[self.resource_name]
 
     # abstract
     def _init_image(self):
@@ -161,12 +169,14 @@ class GraphicsComponent(pygame.sprite.Sprite):
             self.graphics_controller.update()
 
     # display image onto virtual screen (inside the active display)
-    def display(self, screen=None):
+    # alpha moves the image between its position before the last tick (0), and its current position (1)
+    def display(self, screen=None, alpha=1.0):
         if self.image == None:
-            if Warning: print(f"[GC] {self} has no image!")
+            logger.warning("{} has no image!", self)
             return
         if screen is not None:
-            self.graphics_controller.blit_to_camera(self.image, self.rect, screen)
+            rect = interpolate_rect(self.rect, getattr(self, 'previous_pos', None), alpha)
+            self.graphics_controller.blit_to_camera(self.image, rect, screen)
         else:
             graphics_controller.blit(self.image, self.rect)
 
@@ -221,7 +231,7 @@ class Weapon(GraphicsComponent):
     def load_projectile(self):
         if self.amount > 0:  # check if empty
             self.amount -= 1
-            self.projectile = self.ammo_type(self.owner.rect.center)
+            self.projectile = component_pool.acquire(self.ammo_type, self.owner.rect.center)
 
 
 class Vial(GameComponent, PhysicsEntity):
@@ -241,19 +251,44 @@ class Vial(GameComponent, PhysicsEntity):
         super().__init__(pos, size)
         PhysicsEntity.__init__(self)
 
+    # pooled vials of the same size share their images
+    @classmethod
+    def pool_key(cls, pos, size=(14, 14)):
+        return cls, tuple(size)
+
+    def reinit(self, pos, size=(14, 14)):
+        self.rect.topleft = pos
+        self.previous_pos = None
+        self.level = None
+        PhysicsEntity.__init__(self)
+        self._init_image()
+
+    ROTATION_STEP = 30  # degrees between the cached rotations of the image
+
     def _init_image(self):
-        self.image = pygame.transform.smoothscale(self.resource, self.size)
+        self.angle = 0
+        self.image = self.graphics_controller.sprites.get(self.resource_name, self.size)
 
     def update(self, dt):
         self.physics_movement(dt)
-        pygame.transform.rotate(self.image, 360*(dt/1000))
+        # spin one rotation per second
+        self.angle = (self.angle + 360*(dt/1000)) % 360
+        rotation = int(self.angle // self.ROTATION_STEP) * self.ROTATION_STEP
+        self.image = self.graphics_controller.sprites.get(self.resource_name, self.size, rotation=rotation)
+
+    # a rotated image is larger than the vial, it's centred on the rectangle; collisions keep using the rectangle
+    def display(self, screen=None, alpha=1.0):
+        if self.image is None or screen is None:
+            return super().display(screen, alpha)
+        rect = interpolate_rect(self.rect, getattr(self, 'previous_pos', None), alpha)
+        self.graphics_controller.blit_to_camera(self.image, self.image.get_rect(center=rect.center), screen)
 
     def on_collision(self, other):
-        if type(other) == Monster:
+        if isinstance(other, Monster):
             self.kill()
         elif type(other) == Ground:
             self.kill()
-            print("erlemeyer fell on the ground")
+            logger.debug("erlemeyer fell on the ground")
 
     def throw(self, direction):
         if direction == 'right':
@@ -269,6 +304,9 @@ class Vial(GameComponent, PhysicsEntity):
     #start with a speed by acceleration, and decrease speed over time
     # start with speed up, decreese over time
     def physics_movement(self, dt):  # todo: rewrite with Newtonian physics
+        if self.integrated:
+            self.integrated = False
+            return
         # first move the player by it's acceleration (which can have been set by something else)
         # x accel define the acceleration based on current accel, and movement input
         x_accel_direction = lambda: (self.x_accel / abs(self.x_accel)) if self.x_accel != 0 else 0
@@ -281,38 +319,51 @@ class Vial(GameComponent, PhysicsEntity):
         dx, dy = self.x_speed, self.y_speed
 
         self.rect.move_ip(dx, dy)
+        self._moved()
 
-        if PHYSICS_DEBUG:
-            print(
-                f"[PE] {repr(self)} speed:({(self.x_speed)}, {(self.y_speed)}), accel:({(self.x_accel)}, {(self.y_accel)})")
-            print(f"[PE] movement:({dx}, {dy})")
+        physics_logger.debug("{!r} speed:({}, {}), accel:({}, {}), movement:({}, {})", self, self.x_speed, self.y_speed,
+                             self.x_accel, self.y_accel, dx, dy)
 
 # Renders text and makes a surface for it
 class Text(GameComponent):
     """a surface with rendered text"""
     TYPE = "Text"
 
-    # max time in seconds
-    def __init__(self, text, pos, size, max_time=-1, font_size=20):
-        self.font = pygame.font.SysFont("Ariel", font_size)
+    # max time in seconds; wrapped texts are broken into lines that fit in the width of size
+    def __init__(self, text, pos, size, max_time=-1, font_size=20, wrap=False):
+        self.font_size = font_size
+        self.wrap = wrap
         self.text = text
         self.image = None
         super().__init__(pos, size)
-        self.start_time = time.time()
+        self.age = 0  # game time in seconds, so texts expire with the simulation
+        self.max_time = max_time
+
+    # pooled texts with the same text, and font size share their rendered image
+    @classmethod
+    def pool_key(cls, text, pos, size, max_time=-1, font_size=20, wrap=False):
+        return cls, text, font_size, wrap and size[0]
+
+    def reinit(self, text, pos, size, max_time=-1, font_size=20, wrap=False):
+        self.size = size
+        self.rect = pygame.Rect(pos, size)
+        self.previous_pos = None
+        self.level = None
+        self.age = 0
         self.max_time = max_time
 
     def _find_resource(self):
         pass  # no resources are available for text
 
-    def _init_image(self):
-        text = self.font.render(self.text, True, (255, 255, 255))
-        self.image = text  #.convert_alpha()
+    def _init_image(self):  # rendered lines are shared with every text that has them
+        self.image = self.graphics_controller.text.render(self.text, self.font_size, self.size[0] if self.wrap else None)
 
     def update(self, dt):
         if self.max_time == -1:
             pass
         elif self.max_time > 0:
-            if time.time() - self.start_time > self.max_time:
+            self.age += dt / 1000
+            if self.age > self.max_time:
                 self.kill()
 
     def is_alive(self):
@@ -321,23 +372,83 @@ class Text(GameComponent):
 # text meters on screen (for debugging)
 # todo: enable image base meters
 class Meter(GraphicsComponent):
-    """meters which display game state"""
+    """meters which display game state;
+    the value comes from update_function, and is shown as text with text_format"""
     TYPE = 'Meter'
 
-    def __init__(self, update_function, pos):
-        super().__init__(pos)
+    def __init__(self, update_function, pos, text_format='{}', size=(200, 20), font_size=20):
         self.update_function = update_function
-        self.value = 0
+        self.text_format = text_format
+        self.value = None
+        self.text = ''
+        self.font_size = font_size
+        super().__init__(pos, size)
 
     def update(self, dt):
+        """returns whether the text changed"""
         self.value = self.update_function()
+        text = self.text_format.format(self.value)
+        if text == self.text:  # only render again when the text changed
+            return False
+        self.text = text
+        self._init_image()
+        return True
 
-    # todo: decide: change design, or keep doing this for non-image components
-    def _init_image(self):
-        pass  # has no image
+    def _find_resource(self):
+        pass  # meters are rendered text
+
+    def _init_image(self):  # values that come back, like the fps, are rendered once
+        self.image = self.graphics_controller.text.render_line(self.text, self.font_size)
 
     def display(self):
-        pass
+        self.graphics_controller.blit(self.image, self.rect)
+
+class Hud:
+    """Meters composited onto one surface, which is blitted once per frame.
+    Meters only render their text when it changed, and the surface is only composited again when a meter did"""
+
+    def __init__(self):
+        self.meters = {}  # name: Meter, in drawing order
+        self.rect = None  # the part of the screen the meters are on
+        self.surfaces = []  # two surfaces which take turns, see _composite
+        self.image = None
+        self.changed = False
+
+    def __len__(self):
+        return len(self.meters)
+
+    def add(self, name, update_function, pos, text_format='{}', size=(200, 20), font_size=20):
+        meter = self.meters[name] = Meter(update_function, pos, text_format, size, font_size)
+        self.rect = meter.rect.copy() if self.rect is None else self.rect.union(meter.rect)
+        self.surfaces = []  # made again in the size of the new area
+        self.changed = True
+        return meter
+
+    def remove(self, name):
+        del self.meters[name]
+        self.changed = True
+
+    def update(self, dt=0):
+        for meter in self.meters.values():
+            if meter.update(dt):
+                self.changed = True
+        if self.changed:
+            self._composite()
+
+    def _composite(self):
+        # the dirty rectangle renderer sees a changed image by its id, so the image is drawn on the other surface
+        if not self.surfaces:
+            self.surfaces = [pygame.Surface(self.rect.size, pygame.SRCALPHA) for _ in range(2)]
+        surface = self.surfaces[self.surfaces[0] is self.image]
+        surface.fill((0, 0, 0, 0))
+        for meter in self.meters.values():
+            surface.blit(meter.image, (meter.rect.left - self.rect.left, meter.rect.top - self.rect.top))
+        self.image = surface
+        self.changed = False
+
+    def display(self):
+        if self.image is not None:
+            graphics_controller.blit(self.image, self.rect)
 
 class Character(GameComponent, PhysicsEntity):
     """Physical Entity which is able to move ('left', 'right', 'up', 'down', and jumping)"""
@@ -363,24 +474,22 @@ class Character(GameComponent, PhysicsEntity):
 
     # all characters have a list as resource
     def _find_resource(self):
-        resource_amount = 0
-        for resource_name in graphics_controller.resources.keys():
-            if f'{self.name.lower()}' in resource_name:
-                self.walk_images.append(graphics_controller.resources[resource_name])
-                resource_amount += 1
-        self.image_amount = resource_amount
+        self.resource_names = self.find_resource_names(self.name)
+        self.image_amount = len(self.resource_names)
 
-    def _init_image(self):  # prepare the images, and cycle variables
-
-        right_walk_images = self.walk_images
-        left_walk_images = []
+    @staticmethod
+    def find_resource_names(name):
+        return [resource_name for resource_name in graphics_controller.resources.keys()
+                if f'{name.lower()}' in resource_name]
 
-        for i in range(self.image_amount):
-            self.walk_images[i] = pygame.transform.smoothscale(self.walk_images[i].convert_alpha(), self.size)
-            left_walk_images.append(pygame.transform.flip(self.walk_images[i], True, False))
+    def _init_image(self):  # prepare the images, and cycle variables
+        sprites = self.graphics_controller.sprites
+        right_walk_images = [sprites.get(resource_name, self.size) for resource_name in self.resource_names]
+        left_walk_images = [sprites.get(resource_name, self.size, flip=True) for resource_name in self.resource_names]
+        self.walk_images = right_walk_images
         self.directional_walk_images = {-1*self.direction: left_walk_images, 1*self.direction: right_walk_images}
         self.image = self.walk_images[self.walk_cycle]
-        print(f"[CH] images init: {self.image_amount}")
+        logger.debug("character images init: {}", self.image_amount)
 
     def _next_image(self):
         if self.x_movement:
@@ -424,8 +533,7 @@ class Character(GameComponent, PhysicsEntity):
             raise ValueError(f"Movement type not supported: {movement}")
 
         if self.x_accel * self.direction < 0:  # detects if direction has changed by the negative/positive change
-            if DEBUG:
-                print("[D] accel:{} \tdirect: {}".format(self.x_accel, self.direction))
+            physics_logger.debug("accel: {}, direction: {}", self.x_accel, self.direction)
             self.direction *= -1  # reverse direction
             self.turn_around()
 
@@ -465,7 +573,7 @@ class Character(GameComponent, PhysicsEntity):
 
         self.ground = ground
         self.rect.bottom = ground.rect.top + 1
-        self.rect.bottom = ground.rect.top + 1
+        self._moved()
 
     # must be implemented for physical entities
     def on_collision(self, other):
@@ -479,7 +587,7 @@ class Character(GameComponent, PhysicsEntity):
 
         elif type(other) == BuildingBlock:
             # find from which side the block is touched
-            print("[CH] building block touched!")
+            logger.debug("building block touched!")
 
     def update(self, dt):
         self.physics_movement(dt)
@@ -500,19 +608,19 @@ class Player(Character):
         self.accesories[Weapon] = Weapon(self, Vial)
         self._first_attack = True
 
-    def display(self, screen):
-        super().display(screen) # display self
+    def display(self, screen, alpha=1.0):
+        super().display(screen, alpha) # display self
         # display all things the player is holding, and wearing
         for acc in self.accesories.values():
             if acc is not None and not isinstance(acc, GraphicsComponent):
-                acc.display(screen)
+                acc.display(screen, alpha)
 
     def update(self, dt):
         if dt == 0: return  # time must pas, else an update is meaningless
         super().update(dt)
         if self.invulnerable:
             self.invulnerable -= 1
-            if PLAYER_DEBUG: print(f"invulnerable for: {self.invulnerable}")
+            player_logger.debug("invulnerable for: {}", self.invulnerable)
 
     def on_collision(self, other):
         if isinstance(other, Monster):  # if it's a monster (or subtype)
@@ -527,27 +635,22 @@ class Player(Character):
     def attack(self, relative_pos):
         pos = relative_pos[0] - self.level.camera.rect.left, relative_pos[1] - self.level.camera.rect.top
         if self._first_attack:
-            length = len(SALT_DISSOLVING_INSTRUCTIONS)
-            firstpart, secondpart = SALT_DISSOLVING_INSTRUCTIONS[: int(length/ 2)+2], SALT_DISSOLVING_INSTRUCTIONS[int(length/2)+2:]
-            self.level.add_component(Text(firstpart, (self.rect.left, self.rect.top-30),
-                                          (200,50), max_time=100,font_size=22))
-            self.level.add_component(Text(secondpart, (self.rect.left, self.rect.top-10),
-                                          (200,50), max_time=100,font_size=22))
+            self.level.add_component(component_pool.acquire(Text, SALT_DISSOLVING_INSTRUCTIONS,
+                                                            (self.rect.left, self.rect.top-40), (480, 40),
+                                                            max_time=100, font_size=22, wrap=True))
             self.level.freeze = True
             self._first_attack = not self._first_attack
         weapon = self.accesories[Weapon]
         if weapon is not None and weapon.has_ammo():
             weapon.load_projectile()
             weapon.use(pos)
-        if DEBUG:
-            print("[PL] attack at: {}".format(pos))  # do something
+        player_logger.debug("attack at: {}", pos)
 
 
     def stop_independent_x_movement(self, dt):  # for boats or other vehicles
         if dt == 0:
             game_time = 0
-            if WARNING:
-                print('[PL] dt: {}'.format(dt))
+            player_logger.warning("dt: {}", dt)
         else:
             game_time = 1 / dt / GAME_SPEED  # time passed in game = time_per_frame / game_speed_per_frame
 
@@ -560,12 +663,12 @@ class Player(Character):
             x, y, b, h = self.rect
             self.rect = pygame.Rect(x, floor_y, b, h)
 
-        print("[d] floor_y: {}, self_y: {},")
+        player_logger.debug("floor_y: {}, self_y: {}", floor_y, self_y)
 
     def damage(self, damage, direction):
         if self.invulnerable <= 0:
             self.invulnerable = 60  # (1 / (0.033 second/frame)) * 2 seconds ~= 60 frames
-            if DEBUG: print("f[PL] invulnerable for {int(2 * 1/GAME_SPEED)} ticks")  # debug invulnerability time'
+            player_logger.debug("invulnerable for {} ticks", self.invulnerable)
 
             self.x_accel = 6 * direction
             self.y_accel = - self.JUMP_SPEED / 2  # you get thrown in the air
@@ -592,7 +695,7 @@ class Monster(Character):
     def update(self, dt):
         super().update(dt)
         self.make_decision()
-        print(f'schagel PE: xspeed: {self.x_speed}, pos: {self.rect}')
+        physics_logger.debug("{} x speed: {}, pos: {}", self.name, self.x_speed, self.rect)
 
     def make_decision(self):
         raise NotImplementedError("please implement this method!")
@@ -610,7 +713,8 @@ class Monster(Character):
         if self.life_points <= 0:
             self.kill()
     def kill(self):
-        self.level.add_component(Text("NaCl -> Na+(aq) + Cl-(aq)", self.rect.topleft, (200, 100), max_time=10))
+        self.level.add_component(component_pool.acquire(Text, "NaCl -> Na+(aq) + Cl-(aq)", self.rect.topleft, (200, 100),
+                                                        max_time=10))
         super().kill()
 
 class TestMonster(Monster):
@@ -662,23 +766,39 @@ class Portal(GameComponent):
 class StaticLevelComponent(GameComponent):
     """Base class for all image building blocks"""
 
-    def __init__(self, resource_name, pos, size=None):
+    def __init__(self, resource_name, pos, size=None, image=None):
         # if the size is None; it will be determined by the image resolution
+        # image is the scaled image, when it's scaled already (by the level compiler)
         if size is not None and len(size) != 2:
             raise ValueError("Size has to be a tuple of length 2!")
         self.TYPE = resource_name  # A correct name is needed for (image) init
         super(StaticLevelComponent, self).__init__(pos, size)
+        if image is not None:
+            self._image = image
 
     def __repr__(self):
         return super().__repr__() + f"pos: {self.rect.topleft}"
 
+    # the resource is only decoded when it's used, a compiled level has the scaled images, and the baked tiles already
+    def _find_resource(self):
+        self.resource_name = self.TYPE.lower()  # search for image by type name
+        if self.resource_name not in self.graphics_controller.resources:
+            self.resource_name = self.resource_name[:-11]
+
+    @property
+    def resource(self):
+        return self.graphics_controller.resources[self.resource_name]
+
+    # the image is only scaled when it's drawn; backgrounds, and ground are composited into the level tiles from
+    # their resource, so they never hold a level sized scaling
     def _init_image(self):
-        try:
-            self.image = pygame.transform.smoothscale(self.resource, self.size)
-        except ValueError as ex:
-            if WARNING:
-                print(f"[SC] pygame.transform.smoothscale failed with error: {ex}")
-            self.image = pygame.transform.scale(self.resource, self.size)
+        self._image = None
+
+    @property
+    def image(self):
+        if self._image is None:
+            self._image = self.graphics_controller.sprites.get(self.resource_name, self.size)
+        return self._image
 
     def update(self, dt):
         pass
@@ -690,15 +810,15 @@ class BuildingBlock(StaticLevelComponent):
     """buildingblock"""
     TYPE = 'BuildingBlock'
 
-    def __init__(self, resource_name, pos, size=None):
-        super(BuildingBlock, self).__init__(resource_name, pos, size=size)
+    def __init__(self, resource_name, pos, size=None, image=None):
+        super(BuildingBlock, self).__init__(resource_name, pos, size=size, image=image)
 
 class Background(StaticLevelComponent):
     """Background"""
     TYPE = 'Background'
 
-    def __init__(self, resource_name, pos, size=None):
-        super().__init__(resource_name+'_background', pos, size)
+    def __init__(self, resource_name, pos, size=None, image=None):
+        super().__init__(resource_name+'_background', pos, size, image)
 
     @staticmethod
     def scale_background_to_camera(self, size):
@@ -719,8 +839,8 @@ class Ground(StaticLevelComponent):
     """ground"""
     TYPE = 'ground'
 
-    def __init__(self, resource_name, pos, size=None):
-        super(Ground, self).__init__(resource_name, pos, size=size)
+    def __init__(self, resource_name, pos, size=None, image=None):
+        super(Ground, self).__init__(resource_name, pos, size=size, image=image)
 
 
 # game components list
@@ -1,10 +1,492 @@
 # graphics handling
 
+import math
 import os  # resource management
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter, thread_time
 
 import pygame
+from pack_assets import open_pack
+from log import get_logger, INFO
 from configurations import *
 
+logger = get_logger('graphics')
+
+FONT_LOCK = threading.RLock()  # fonts aren't thread safe, and levels are built on a worker thread
+WHITE = (255, 255, 255)
+
+
+class ResourceManager:
+    """Graphical resources by name (file name without extension).
+    All names are known up front, but a resource is only decoded on first access.
+    Decoded surfaces are kept in a least recently used cache which is bounded by memory.
+    Resources in the asset pack (see pack_assets.py) aren't decoded, their surfaces are made from the packed pixels"""
+
+    def __init__(self, resource_dirs, max_bytes=RESOURCE_CACHE_SIZE, pack=None):
+        self.paths = {}  # name: file path
+        for resource_dir in resource_dirs.values():
+            for resource in sorted(os.listdir(resource_dir)):
+                self.paths[resource[:-4]] = os.path.join(resource_dir, resource)
+        self.pack = pack
+        self.packed = pack.current(self.paths) if pack is not None else set()  # changed files are decoded again
+        self.max_bytes = max_bytes
+        self.surfaces = OrderedDict()  # name: decoded surface; the least recently used comes first
+        self.bytes = 0  # memory held by the decoded surfaces
+        self.hits = 0
+        self.misses = 0
+        self.decode_times = {}  # name: cpu milliseconds it took to decode, shows which files are worth shrinking
+        self.lock = threading.RLock()  # levels are loaded on a worker thread, while the main thread draws
+
+    def __repr__(self):
+        return (f"resources: {len(self.surfaces)}/{len(self.paths)} decoded, {len(self.packed)} packed, "
+                f"{self.bytes // 1024} KiB")
+
+    def __contains__(self, name):
+        return name in self.paths
+
+    def __iter__(self):
+        return iter(self.paths)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def keys(self):
+        return self.paths.keys()
+
+    def __getitem__(self, name):
+        with self.lock:
+            surface = self.surfaces.get(name)
+            if surface is not None:
+                self.hits += 1
+                self.surfaces.move_to_end(name)
+                return surface
+            self.misses += 1
+        return self._add(name, self._decode(name))  # decoded outside of the lock, so other threads can go on
+
+    def _add(self, name, surface):
+        with self.lock:
+            if name in self.surfaces:  # decoded by another thread meanwhile
+                return self.surfaces[name]
+            self.surfaces[name] = surface
+            self.bytes += self.surface_bytes(surface)
+            self._evict()
+        return surface
+
+    def _decode(self, name):
+        if name in self.packed:  # already decoded, the surface is on top of the packed pixels
+            return self.pack.surface(name)
+        start = thread_time()  # the time of this thread, other decoding threads don't count
+        surface = pygame.image.load(self.paths[name])  # a KeyError for unknown names, like a dict
+        self.decode_times[name] = (thread_time() - start) * 1000
+        logger.debug("decoded: {} {} in {:.1f} ms", name, surface.get_size(), self.decode_times[name])
+        return surface
+
+    @staticmethod
+    def surface_bytes(surface):
+        width, height = surface.get_size()
+        return width * height * surface.get_bytesize()
+
+    # drops the least recently used surfaces until the cache fits, the last decoded surface is always kept
+    def _evict(self):
+        while self.bytes > self.max_bytes and len(self.surfaces) > 1:
+            name, surface = self.surfaces.popitem(last=False)
+            self.bytes -= self.surface_bytes(surface)
+            logger.debug("evicted: {}", name)
+
+    def load(self, names, workers=RESOURCE_DECODE_WORKERS):
+        """decodes the resources that aren't decoded yet at the same time, pygame lets go of the GIL while it decodes.
+        The resources are added to the cache in order, so more than fits in it pushes the first ones out again"""
+        with self.lock:
+            names = [name for name in dict.fromkeys(names) if name not in self.surfaces]
+        if not names:
+            return
+        start = perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for name, surface in zip(names, executor.map(self._decode, names)):
+                self._add(name, surface)
+        if logger.enabled(INFO):
+            decoded = sorted((name for name in names if name in self.decode_times),
+                             key=lambda name: self.decode_times[name], reverse=True)  # slowest first
+            logger.info("{} resources loaded in {:.1f} ms, {} decoded in {:.1f} ms", len(names),
+                        (perf_counter() - start) * 1000, len(decoded), sum(self.decode_times[name] for name in decoded))
+            for name in decoded:
+                logger.info(" {}: {:.1f} ms", name, self.decode_times[name])
+
+    def preload(self, level_name, names=()):
+        """decodes every resource of a level (the names that start with the level name), and the given names"""
+        self.load([name for name in self.paths if name.startswith(level_name + '_') or name in names])
+
+    def load_all(self):
+        self.load(self.paths)
+
+    def clear(self):
+        with self.lock:
+            self.surfaces.clear()
+            self.bytes = 0
+
+class SpriteCache:
+    """Transformed (scaled, flipped, rotated) resources, shared by every graphics component.
+    A transformation is only done once per (resource name, size, flip, rotation), while it's in the cache;
+    the cache is bounded by memory like the resources, the least recently used are dropped.
+    Surfaces larger than the screen (like a background scaled to the level) are one-offs, they aren't cached"""
+
+    def __init__(self, resources, max_bytes=SPRITE_CACHE_SIZE, max_area=CAMERA_WIDTH * CAMERA_HEIGHT):
+        self.resources = resources
+        self.max_bytes = max_bytes
+        self.max_area = max_area  # pixels of the largest surface that's cached
+        self.surfaces = OrderedDict()  # (resource name, size, flip, rotation): surface; least recently used first
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.RLock()  # components are also built by the level loader
+
+    def __repr__(self):
+        return (f"sprites: {len(self.surfaces)} cached, {self.bytes // 1024} KiB, hits: {self.hits}, "
+                f"misses: {self.misses}")
+
+    def get(self, name, size=None, flip=False, rotation=0):
+        """returns the resource scaled to size, flipped horizontally, and rotated counterclockwise in degrees.
+        The returned surface is shared, so it must not be drawn on"""
+        if size is not None:
+            size = tuple(size)
+        key = (name, size, flip, rotation)
+        with self.lock:
+            surface = self.surfaces.get(key)
+            if surface is not None:
+                self.hits += 1
+                self.surfaces.move_to_end(key)
+                return surface
+            self.misses += 1
+            if rotation:  # every transformation is built on top of the cached transformation before it
+                surface = pygame.transform.rotate(self.get(name, size, flip), rotation)
+            elif flip:
+                surface = pygame.transform.flip(self.get(name, size), True, False)
+            else:
+                surface = self._scale(name, size)
+            width, height = surface.get_size()
+            if width * height <= self.max_area:
+                self.surfaces[key] = surface
+                self.bytes += ResourceManager.surface_bytes(surface)
+                self._evict()
+        return surface
+
+    def _evict(self):
+        while self.bytes > self.max_bytes and len(self.surfaces) > 1:
+            _, surface = self.surfaces.popitem(last=False)
+            self.bytes -= ResourceManager.surface_bytes(surface)
+
+    def _scale(self, name, size):
+        surface = self.resources[name]
+        if pygame.display.get_surface() is not None:  # converting needs an initialized display
+            surface = surface.convert_alpha()
+        if size is None:
+            return surface
+        return scale(surface, size)
+
+    def clear(self):
+        with self.lock:
+            self.surfaces.clear()
+            self.bytes = 0
+
+
+def source_span(start, end, length, size, padding=BACKGROUND_SCALE_PADDING, alignment=BACKGROUND_SCALE_ALIGNMENT):
+    """the source pixels (first, last) to scale for the pixels start to end of length source pixels stretched over
+    size pixels, and where they end up (first, last) in those pixels.
+    Scaling smooths over the edges of what's scaled, so it's padded, and its ends are moved out to the source pixels
+    which land closest to a whole pixel; that way the part is scaled on the same grid as the whole surface"""
+    if length < 2:
+        return 0, length, 0, size
+    # smoothscale interpolates between the first, and the last pixel when it enlarges, and averages when it shrinks
+    expand = size > length
+    spacing = ((length - 1) if expand else length) / size  # source pixels per pixel
+
+    def error(pixel):
+        position = pixel / spacing
+        return abs(position - round(position))
+
+    first = int(start * spacing) - padding
+    first = 0 if first - alignment <= 0 else min(range(first - alignment, first + 1), key=error)
+    end_pixel = length - 1 if expand else length  # the source position the scaled part ends at
+    last = math.ceil(end * spacing) + padding
+    last = end_pixel if last + alignment >= end_pixel else min(range(last, last + alignment + 1), key=error)
+    dest_first = round(first / spacing)
+    return first, last + expand, dest_first, max(dest_first + 1, round(last / spacing))
+
+
+def scale(surface, size):
+    try:
+        return pygame.transform.smoothscale(surface, size)
+    except ValueError as ex:  # smoothscale only works on 24, and 32 bit surfaces
+        logger.warning("pygame.transform.smoothscale failed with error: {}", ex)
+        return pygame.transform.scale(surface, size)
+
+
+class TextCache:
+    """Fonts, and rendered text, shared by every text on screen.
+    A font is only opened once per (family, size). Rendered lines (runs of glyphs) are kept in a least recently used
+    cache, and longer texts are word wrapped into lines, so a line is rendered once for every text it's in"""
+
+    def __init__(self, max_lines=TEXT_CACHE_SIZE, family=TEXT_FONT):
+        self.family = family
+        self.max_lines = max_lines
+        self.fonts = {}  # (family, size): font
+        self.lines = OrderedDict()  # (family, size, colour, text): rendered line; the least recently used comes first
+        self.layouts = OrderedDict()  # (family, size, width, text): the wrapped lines
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return f"text: {len(self.fonts)} fonts, {len(self.lines)} lines cached, hits: {self.hits}, misses: {self.misses}"
+
+    def font(self, size, family=None):
+        key = (family or self.family, size)
+        with FONT_LOCK:
+            font = self.fonts.get(key)
+            if font is None:
+                font = self.fonts[key] = pygame.font.SysFont(*key)
+        return font
+
+    def render_line(self, text, size, colour=WHITE, family=None):
+        """the text rendered on one line; the surface is shared, so it must not be drawn on"""
+        key = (family or self.family, size, colour, text)
+        with FONT_LOCK:
+            surface = self.lines.get(key)
+            if surface is not None:
+                self.hits += 1
+                self.lines.move_to_end(key)
+                return surface
+            self.misses += 1
+            surface = self.lines[key] = self.font(size, family).render(text, True, colour)
+            if len(self.lines) > self.max_lines:
+                self.lines.popitem(last=False)
+        return surface
+
+    def wrap(self, text, width, size, family=None):
+        """the lines of text, broken between words so they fit in width (pixels); a word that's wider than width
+        gets a line of its own, and new lines always break"""
+        key = (family or self.family, size, width, text)
+        with FONT_LOCK:
+            lines = self.layouts.get(key)
+            if lines is not None:
+                self.layouts.move_to_end(key)
+                return lines
+            font = self.font(size, family)
+            lines = []
+            for paragraph in text.split('\n'):
+                line = ''
+                for word in paragraph.split():
+                    candidate = f"{line} {word}" if line else word
+                    if line and font.size(candidate)[0] > width:
+                        lines.append(line)
+                        line = word
+                    else:
+                        line = candidate
+                lines.append(line)
+            self.layouts[key] = lines
+            if len(self.layouts) > self.max_lines:
+                self.layouts.popitem(last=False)
+        return lines
+
+    def render(self, text, size, width=None, colour=WHITE, family=None):
+        """the text rendered, and word wrapped to width when it's given; the lines are stacked at the line height
+        of the font"""
+        if width is None:
+            return self.render_line(text, size, colour, family)
+        lines = [self.render_line(line, size, colour, family) for line in self.wrap(text, width, size, family)]
+        if len(lines) == 1:
+            return lines[0]
+        line_height = self.font(size, family).get_linesize()
+        surface = pygame.Surface((max(line.get_width() for line in lines), line_height * len(lines)), pygame.SRCALPHA)
+        for index, line in enumerate(lines):  # copied as they are, blending would darken the edges of the glyphs
+            surface.blit(line, (0, line_height * index), special_flags=pygame.BLEND_RGBA_MAX)
+        return surface
+
+    def clear(self):
+        with FONT_LOCK:
+            self.lines.clear()
+            self.layouts.clear()
+
+
+class TiledSurface:
+    """A (level sized) surface split into fixed size tiles, which are composited from layers when needed.
+    Only the tiles around the last prefetched rectangle are kept in memory.
+    A layer is the source surface, and the rectangle it's stretched over; only the part in a tile is scaled.
+    baked(key) can return the RGB pixels, and size of a tile that was composited before, the layers go on top"""
+
+    def __init__(self, size, layers=(), colour=(0, 0, 0), tile_size=BACKGROUND_TILE_SIZE,
+                 margin=BACKGROUND_PREFETCH_MARGIN, baked=None):
+        self.rect = pygame.Rect((0, 0), size)
+        self.layers = list(layers)  # (source surface, rect) pairs, blitted from first to last
+        self.baked = baked
+        self.colour = colour
+        self.tile_size = tile_size
+        self.margin = margin  # pixels around the prefetched rectangle of which the tiles are kept
+        self.tiles = {}  # (column, row): composited tile
+        self.generation = 0  # counts the layer changes, tiles composited before the last change are stale
+
+    def __repr__(self):
+        return f"tiles: {len(self.tiles)} resident, size: {self.rect.size}"
+
+    def add_layer(self, surface, rect):
+        self.layers.append((surface, rect))
+        self.generation += 1
+        for key in self._keys(rect):  # tiles under the new layer are composited again on their next use
+            self.tiles.pop(key, None)
+
+    def _keys(self, rect):
+        rect = rect.clip(self.rect)
+        if not rect.width or not rect.height:
+            return []
+        size = self.tile_size
+        return [(column, row) for column in range(rect.left // size, (rect.right - 1) // size + 1)
+                for row in range(rect.top // size, (rect.bottom - 1) // size + 1)]
+
+    def keys(self, rect=None):
+        """every tile, or the tiles overlapping rect, column by column"""
+        return self._keys(self.rect if rect is None else rect)
+
+    def tile_rect(self, key):
+        column, row = key
+        return pygame.Rect(column * self.tile_size, row * self.tile_size,
+                           self.tile_size, self.tile_size).clip(self.rect)
+
+    def compose(self, key):
+        """builds the tile at key out of every layer that overlaps it"""
+        tile_rect = self.tile_rect(key)
+        if self.baked is not None:
+            pixels, size = self.baked(key)
+            tile = pygame.image.frombuffer(pixels, size, 'RGB').copy()  # copied, the pixels are read only
+        else:
+            tile = pygame.Surface(tile_rect.size)
+            tile.fill(self.colour)
+        for surface, rect in self.layers:
+            if not rect.colliderect(tile_rect):
+                continue
+            if surface.get_size() == rect.size:
+                tile.blit(surface, (rect.left - tile_rect.left, rect.top - tile_rect.top))
+            else:
+                self._blit_scaled(tile, tile_rect, surface, rect)
+        if pygame.display.get_surface() is not None:
+            tile = tile.convert()
+        return tile
+
+    @staticmethod
+    def _blit_scaled(tile, tile_rect, surface, rect):
+        """blits the part of surface, stretched over rect, that's in the tile; only that part is scaled.
+        Every tile maps the source onto the level the same way, so the tiles line up like one scaled surface"""
+        visible = rect.clip(tile_rect)
+        left, right, dest_left, dest_right = source_span(visible.left - rect.left, visible.right - rect.left,
+                                                         surface.get_width(), rect.width)
+        top, bottom, dest_top, dest_bottom = source_span(visible.top - rect.top, visible.bottom - rect.top,
+                                                         surface.get_height(), rect.height)
+        part = scale(surface.subsurface((left, top, right - left, bottom - top)),
+                     (dest_right - dest_left, dest_bottom - dest_top))
+        # the padding outside of the tile is cut off by the blit
+        tile.blit(part, (rect.left + dest_left - tile_rect.left, rect.top + dest_top - tile_rect.top))
+
+    def tile(self, key):
+        tile = self.tiles.get(key)
+        if tile is None:
+            tile = self.tiles[key] = self.compose(key)
+        return tile
+
+    def prefetch(self, rect):
+        """composites the tiles around rect, and drops all the others"""
+        keep = set(self._keys(rect.inflate(self.margin * 2, self.margin * 2)))
+        for key in [key for key in self.tiles if key not in keep]:
+            del self.tiles[key]
+        for key in keep:
+            self.tile(key)
+
+    def blit(self, screen, area, dest=(0, 0)):
+        """blits the part of the surface inside area onto screen, with the topleft of area at dest"""
+        for key in self._keys(area):
+            tile_rect = self.tile_rect(key)
+            visible = tile_rect.clip(area)
+            screen.blit(self.tile(key), (visible.left - area.left + dest[0], visible.top - area.top + dest[1]),
+                        visible.move(-tile_rect.left, -tile_rect.top))
+
+    # tiles composited somewhere else, like on a worker thread; they're dropped when a layer changed meanwhile
+    def add_tiles(self, tiles, generation=None):
+        if generation is None or generation == self.generation:
+            self.tiles.update(tiles)
+
+    def release(self, rect=None):
+        """drops the tiles overlapping rect, or all of them"""
+        if rect is None:
+            self.tiles.clear()
+            return
+        for key in self._keys(rect):
+            self.tiles.pop(key, None)
+
+
+class DirtyRectRenderer:
+    """Collects the sprites of a frame, and only redraws the parts of the screen that changed since the last frame.
+    The background is restored under the old, and new position of every changed sprite,
+    overlapping regions are merged, and only those are passed on to the display update"""
+
+    def __init__(self):
+        self.sprites = []  # (surface, screen rect) of the frame that is being built, in drawing order
+        self.previous = []  # the sprites of the last drawn frame; holding them keeps their ids unique
+        self.background = None  # function(screen, screen area) which draws the background in an area
+        self.background_key = None  # when the key changes (the camera scrolled) the whole screen is redrawn
+        self.full_redraw = True
+        self.updated_area = 0  # pixels updated on the display during the last frame
+
+    def set_background(self, draw_function, key):
+        if key != self.background_key:
+            self.full_redraw = True
+        self.background = draw_function
+        self.background_key = key
+
+    def add(self, surface, rect):
+        self.sprites.append((surface, rect))
+
+    @staticmethod
+    def merge(rects):
+        """unites rectangles until none of them overlap"""
+        merged = []
+        for rect in rects:
+            rect = rect.copy()
+            overlap = rect.collidelist(merged)
+            while overlap != -1:
+                rect.union_ip(merged.pop(overlap))
+                overlap = rect.collidelist(merged)
+            merged.append(rect)
+        return merged
+
+    def draw(self, screen):
+        """draws the collected frame, returns the list of changed rectangles, or None when all of the screen changed"""
+        screen_rect = screen.get_rect()
+        if self.full_redraw or self.background is None:
+            if self.background is not None:
+                self.background(screen, screen_rect)
+            for surface, rect in self.sprites:
+                screen.blit(surface, rect)
+            dirty = None
+            self.updated_area = screen_rect.width * screen_rect.height
+        else:
+            previous = {(id(surface), tuple(rect)) for surface, rect in self.previous}
+            current = {(id(surface), tuple(rect)) for surface, rect in self.sprites}
+            changed = [rect for surface, rect in self.previous if (id(surface), tuple(rect)) not in current]
+            changed += [rect for surface, rect in self.sprites if (id(surface), tuple(rect)) not in previous]
+            dirty = [rect for rect in self.merge(rect.clip(screen_rect) for rect in changed) if rect.width and rect.height]
+            for area in dirty:
+                screen.set_clip(area)  # sprites outside of the area are already on the screen
+                self.background(screen, area)
+                for surface, rect in self.sprites:
+                    if area.colliderect(rect):
+                        screen.blit(surface, rect)
+            screen.set_clip(None)
+            self.updated_area = sum(rect.width * rect.height for rect in dirty)
+        self.previous = self.sprites
+        self.sprites = []
+        self.full_redraw = False
+        return dirty
+
+
 class Graphics:
     """Graphical resources, Graphics handling, and display control"""
     # a list with all sub-resource dirs (the keys are in lower case)
@@ -20,38 +502,49 @@ class Graphics:
         self.camera = None
 
         # resources
-        self.resources = {}  # holds the loaded graphical resources grouped (by directory)
-        self.load_resources()  # loads all resources; file extensions are not part of the name
+        # decodes on first access; file extensions are not part of the name
+        self.resources = ResourceManager(self.RESOURCE_DIRS, pack=open_pack())
+        self.sprites = SpriteCache(self.resources)  # scaled, and flipped resources shared by all components
+        self.text = TextCache()  # fonts, and rendered lines shared by all texts
 
         self.dirty_rects = []  # an updated list of rectangles that have yet to be updated on the screen
+        self.renderer = None  # draws, and updates only what changed on screen
+        self.set_dirty_rect_rendering(DIRTY_RECT_RENDERING)
 
+    # dirty rectangle rendering is opt-in, without it every frame is drawn, and updated completely
+    def set_dirty_rect_rendering(self, enabled):
+        self.renderer = DirtyRectRenderer() if enabled else None
+
+    # opening the window again is skipped, level_builder calls this for every level
     def init_screen(self,window_resolution=None):
         if window_resolution is not None:
             self.CAMERA_WIDTH, self.CAMERA_HEIGHT = window_resolution
+        if self.screen is not None and self.screen is pygame.display.get_surface():
+            return
         self.screen = pygame.display.set_mode((CAMERA_WIDTH, CAMERA_HEIGHT), pygame.HWSURFACE)
         pygame.display.set_caption("Mad Salts")
-        if INFO:
-            print("window on screen initialized, with res: {}".format((CAMERA_WIDTH, CAMERA_HEIGHT)))
+        logger.info("window on screen initialized, with res: {}", (CAMERA_WIDTH, CAMERA_HEIGHT))
 
 
     def set_camera(self, camera):
-        print("[SC] camera set: {}".format(camera))
+        logger.info("camera set: {}", camera)
         self.camera = camera
 
     def unset_camera(self):
         self.camera = None
 
     def blit_to_camera(self, surface, rect, camera_rect):
-        if GRAPHICS_DEBUG:
-            print(f"[GE] rect:{rect}\tblitted to:{camera}")
+        logger.debug("rect: {} blitted to: {}", rect, camera_rect)
         if camera_rect.colliderect(rect):
             x0, y0 = rect.topleft
             x1, y1 = camera_rect.topleft
             dest = (x0 - x1, y0 - y1) # topleft of object - topleft of the camera
-            self.screen.blit(surface, dest)
+            if self.renderer is not None:
+                self.renderer.add(surface, pygame.Rect(dest, surface.get_size()))
+            else:
+                self.screen.blit(surface, dest)
         else:
-            if WARNING:
-                print(f"[GE] '{surface}' not on camera: '{rect}'")
+            logger.debug("'{}' not on camera: '{}'", surface, rect)  # every frame, for everything off screen
 
     def update_camera(self):
         self.screen.update()
@@ -59,52 +552,53 @@ class Graphics:
     # load graphics resources (sounds, and graphics)
     # doesn't do any conversion. loads as is!
     def load_resources(self):
-        """Goes through all the resource dirs, and loads the resources into a dict"""
-        for resource_type in self.RESOURCE_DIRS:
-            resource_dir = self.RESOURCE_DIRS[resource_type]
-            resources = os.listdir(resource_dir)
-            for resource in resources:
-                self.resources[resource[:-4]] = pygame.image.load(os.path.join(resource_dir, resource))
+        """Decodes every resource in the resource dirs at once (as far as the resource cache allows)"""
+        self.resources.load_all()
 
     # update blitted (aka 'dirty') rectangles on every frame
     def update(self):
-        if self.dirty_rects:
-            self.update_dirty_rects()
+        """Puts the frame on the display; with dirty rectangle rendering only the parts that changed"""
+        if self.renderer is not None:
+            self.dirty_rects = self.renderer.draw(self.screen)
+            if self.dirty_rects is None:  # the camera scrolled
+                pygame.display.update()
+            elif self.dirty_rects:
+                pygame.display.update(self.dirty_rects)  # update is faster when all rectangles are passed at once
+        else:
+            pygame.display.update()
+        logger.debug("rects updated: {}", self.dirty_rects)
+        self.dirty_rects = []
 
-    # takes a string, returns a blittable text label
-    # word wrapping should be done by making multiple labels
-    def make_text(self, text, color=(0, 0, 0)):
-        raise NotImplementedError()
+    # takes a string, returns a blittable text label, word wrapped to width when it's given
+    def make_text(self, text, color=(0, 0, 0), size=20, width=None):
         if type(text) != str:
             raise TypeError("Text must be a string!")
-        return self.font.render(text, 1, color)
+        return self.text.render(text, size, width, color)
 
     def add_text_overlay(self):
         pass
 
-    # accepts a set of blittable objects
-    # order matters! first with the background, and last is the foreground
-    def display_all(self):
-        # self.screen.fill(pygame.Color('black')) #  fill screen with black
-        if len(self.dirty_rects) > 0:
-            self.screen.update([rect for rect in self.dirty_rects.empty()])
-        pygame.display.flip()
-
-    # all rectangles that have changed on the display get updated
-    def update_dirty_rects(self):
-        """Updates every rectangle in game for rectangle in dirty rectangles"""
-        pygame.display.update(self.dirty_rects)  # update is faster when all rectangles are passed at once
-        if DEBUG:
-            print("[GA] rects blitted: {}".format(self.dirty_rects))  # debugging
-        self.dirty_rects.clear()
+    # blits the camera's view of a tiled surface to the display
+    def blit_tiled(self, tiled_surface, camera_rect):
+        tiled_surface.prefetch(camera_rect)
+        if self.renderer is not None:  # the renderer restores the parts of the background it needs
+            x, y = camera_rect.topleft
+            self.renderer.set_background(lambda screen, area: tiled_surface.blit(screen, area.move(x, y), area.topleft),
+                                         (id(tiled_surface), tiled_surface.generation, x, y))
+        else:
+            tiled_surface.blit(self.screen, camera_rect)
+            self.dirty_rects.append(self.screen.get_rect())
 
     # blits image to the display surface, and adds the rectangle to a list
     def blit(self, surface, rect, area=None):
-
+        if self.renderer is not None:
+            if area is not None:
+                surface = surface.subsurface(area)
+            self.renderer.add(surface, pygame.Rect(rect[:2], surface.get_size()))
+            return
         self.screen.blit(surface, rect, area)
         self.dirty_rects.append(rect)
-        if DEBUG:
-            print("[GE] blitted: {}, rect: {}".format(surface, rect))
+        logger.debug("blitted: {}, rect: {}", surface, rect)
 
     def display(self, image, rect):
         self.blit(image, rect)
@@ -123,8 +617,7 @@ class Camera:
         self.rect = pygame.Rect((0, 0), (CAMERA_WIDTH, CAMERA_HEIGHT))
         self.extreme_point = level_limit
         self.update(target_rect)  # this must be the last line, because it uses the state to define the next
-        if INFO:
-            print(f"[CA] Initiated {repr(self)}")
+        logger.info("camera initiated: {!r}", self)
 
     def __repr__(self):
         x, y, w, h = self.rect
@@ -133,6 +626,9 @@ class Camera:
     def apply(self, rect):
         return rect.throw(self.state)
 
+    def interpolated_rect(self, alpha):
+        return interpolate_rect(self.rect, getattr(self, 'previous_pos', None), alpha)
+
     def update(self, target_rect):
         half_camera_width = CAMERA_WIDTH / 2
         half_camera_height = CAMERA_HEIGHT / 2
@@ -153,8 +649,15 @@ class Camera:
             self.rect.bottom = self.extreme_point[1]
         else:
             self.rect.centery = cy
-        if DEBUG:
-            print("[CA] update: {}".format(self.rect))
+        logger.debug("camera update: {}", self.rect)
+
+
+# a rectangle in between its previous position, and its current one
+def interpolate_rect(rect, previous_pos, alpha):
+    if previous_pos is None or alpha >= 1:
+        return rect
+    x0, y0 = previous_pos
+    return pygame.Rect(round(x0 + (rect.left - x0) * alpha), round(y0 + (rect.top - y0) * alpha), *rect.size)
 
 
 def simple_camera(camera, target_rect):
@@ -0,0 +1,376 @@
+#!/bin/python3
+
+# level files: levels are written as JSON sources in level_data/, and compiled into a binary file which is
+# mapped into memory when the level is loaded. The compiled file holds everything that's expensive to work out:
+# the sizes of the (scaled) components, the ground sorted for the collision index, the baked background tiles, and the
+# scaled images of the static components that are drawn.
+# It's named after a hash of everything it's built from, so a level is only compiled again when that changes. The size,
+# and modification time of those files are kept next to it, they're only read, and hashed again when these change.
+# A level with a segment width is streamed, only the segments around the camera are loaded (see StreamingLevel)
+#
+# usage: python level_compiler.py [level number ...] [--check]  (compiles all levels when none are given)
+# --check compares a strip of background tiles of every level with its layers scaled as a whole, it needs numpy
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+
+import pygame
+
+try:
+    import numpy
+except ImportError:  # only the check of the tiles needs numpy
+    numpy = None
+
+import configurations
+from game_components import Background, BuildingBlock, ForeGround, Ground, Text
+from graphics import controller as graphics_controller, TiledSurface, complex_camera, simple_camera, scale
+from log import get_logger
+from configurations import *
+
+logger = get_logger('levels')
+
+MAGIC = b'MSLV'
+FORMAT_VERSION = 4  # also changed when the tiles are composited differently
+
+STATIC_TYPES = [Ground, Background, ForeGround, BuildingBlock]  # the type codes are the positions in these lists
+DYNAMIC_TYPES = [Text]
+TYPE_NAMES = {type.__name__: type for type in STATIC_TYPES + DYNAMIC_TYPES}
+CAMERA_TYPES = {'complex': complex_camera, 'simple': simple_camera}
+NO_CAMERA = 255
+IMAGE_TYPES = (ForeGround,)  # static components that are drawn, instead of baked into the tiles
+
+# file layout, little endian; the header is followed by the sections, which are found by their offsets
+HEADER = struct.Struct('<4sHHii3BBIiiiiIIIIIIIIIII')
+STRING = struct.Struct('<II')  # offset, and length of the utf-8 text
+STATIC = struct.Struct('<BxxxIiiiiI')  # type, resource name (string), x, y, width, height, image offset (0 if none)
+GROUND = struct.Struct('<I')  # index of a ground component, in the order of the collision index
+DYNAMIC = struct.Struct('<BxxxIiiiiiHxx')  # type, text (string), x, y, width, height, max time, font size
+TILE = struct.Struct('<III')  # offset, width, and height of the RGB pixels of a tile; tiles go column by column
+# the RGBA pixels of the images, of the size of their component, follow the pixels of the tiles
+
+
+def source_path(level_number):
+    return os.path.join(LEVEL_DATA_DIR, f"level_{level_number}.json")
+
+
+def read_source(level_number):
+    """returns the level source, with the text constants filled in"""
+    path = source_path(level_number)
+    if not os.path.exists(path):
+        raise NotImplementedError(f"Level value hasn't been implemented! {level_number}")
+    with open(path) as file:
+        source = json.load(file)
+    for component in source['dynamic']:
+        if 'text_constant' in component:
+            component['text'] = getattr(configurations, component.pop('text_constant'))
+    return source
+
+
+def find_resource(name):
+    """the resource of a static component, found like GraphicsComponent._find_resource does"""
+    name = name.lower()
+    return name if name in graphics_controller.resources else name[:-11]
+
+
+def resource_names(source):
+    """the resources a level is built from"""
+    names = [source['name'] + '_background']
+    for component in source['static']:
+        names.append(component['resource'] + ('_background' if component['type'] == 'Background' else ''))
+    return sorted(set(find_resource(name) for name in names))
+
+
+def source_files(level_number, source):
+    """the files a level is built from: its source, the configuration with the text constants, and its resources"""
+    return ([source_path(level_number), configurations.__file__] +
+            [graphics_controller.resources.paths[name] for name in resource_names(source)])
+
+
+def file_stats(paths):
+    """path: [size, modification time] of every file, or None when it doesn't exist"""
+    stats = {}
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            stats[path] = None
+        else:
+            stats[path] = [stat.st_size, stat.st_mtime_ns]
+    return stats
+
+
+def source_hash(source):
+    """hash of the source, the resources it uses, and the format they're compiled into"""
+    digest = hashlib.sha256(f"{FORMAT_VERSION} {BACKGROUND_TILE_SIZE}".encode())
+    digest.update(json.dumps(source, sort_keys=True).encode())
+    for name in resource_names(source):
+        with open(graphics_controller.resources.paths[name], 'rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+class StringTable:
+    def __init__(self):
+        self.strings = []
+        self.indices = {}
+
+    def add(self, text):
+        if text not in self.indices:
+            self.indices[text] = len(self.strings)
+            self.strings.append(text)
+        return self.indices[text]
+
+
+def build_static(source):
+    """the size of the level in the source, its background, and its static components"""
+    size = source['size'] and tuple(source['size'])
+    background_size = source['background'].get('size')  # the background is scaled to the level when it has no size
+    background = Background(source['name'], tuple(source['background']['pos']),
+                            tuple(background_size) if background_size else size)
+    static = [TYPE_NAMES[component['type']](component['resource'], tuple(component['pos']),
+                                            component.get('size') and tuple(component['size']))
+              for component in source['static']]
+    return size or background.size, background, static
+
+
+def compile_level(source, path):
+    """builds the level in the source, and writes it to path"""
+    from levels import Level  # levels loads its levels from here
+    strings = StringTable()
+    name = strings.add(source['name'])
+    segment_width = source.get('segment_width', 0)
+    if segment_width % BACKGROUND_TILE_SIZE:  # a tile belongs to one segment
+        raise ValueError(f"the segment width has to be a multiple of {BACKGROUND_TILE_SIZE}: {segment_width}")
+    size, background, static = build_static(source)
+    tiles, _ = Level.build_background(size, background=background, static_components=static)
+
+    resources = [strings.add(data['resource']) for data in source['static']]  # added before the strings are laid out
+    # the images are scaled here once, instead of every time the level is loaded
+    images = [pygame.image.tostring(component.image, 'RGBA') if type(component) in IMAGE_TYPES else None
+              for component in static]
+    # the collision index sorts the ground on its left side, and the order it was built in
+    ground = sorted([index for index, component in enumerate(static) if type(component) in Level.GROUND_TYPES],
+                    key=lambda index: (static[index].rect.left, index))
+    ground_data = b''.join(GROUND.pack(index) for index in ground)
+    dynamic_data = b''.join(DYNAMIC.pack(DYNAMIC_TYPES.index(TYPE_NAMES[component['type']]),
+                                         strings.add(component['text']),
+                                         *component['pos'], *component['size'], component.get('max_time', -1),
+                                         component.get('font_size', 20)) for component in source['dynamic'])
+
+    # the background tiles as RGB, so the file doesn't depend on the format of the screen
+    tile_pixels = []
+    for key in tiles.keys():
+        tile = tiles.tile(key)
+        tile_pixels.append((pygame.image.tostring(tile, 'RGB'), tile.get_size()))
+
+    # offsets follow from the size of the sections before them
+    strings_offset = HEADER.size
+    blob_offset = strings_offset + STRING.size * len(strings.strings)
+    encoded = [text.encode() for text in strings.strings]
+    string_table, offset = [], blob_offset
+    for text in encoded:
+        string_table.append(STRING.pack(offset, len(text)))
+        offset += len(text)
+    static_offset = offset
+    ground_offset = static_offset + STATIC.size * len(static)
+    dynamic_offset = ground_offset + len(ground_data)
+    tiles_offset = dynamic_offset + len(dynamic_data)
+    tile_table, offset = [], tiles_offset + TILE.size * len(tile_pixels)
+    for pixels, (width, height) in tile_pixels:
+        tile_table.append(TILE.pack(offset, width, height))
+        offset += len(pixels)
+    image_offsets = []
+    for pixels in images:
+        image_offsets.append(offset if pixels else 0)
+        offset += len(pixels or b'')
+    static_data = b''.join(STATIC.pack(STATIC_TYPES.index(type(component)), resource, *component.rect, image_offset)
+                           for component, resource, image_offset in zip(static, resources, image_offsets))
+
+    camera = source.get('camera')
+    player = source['player']
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, tiles.tile_size, *size, *tiles.colour,
+                         NO_CAMERA if camera is None else list(CAMERA_TYPES).index(camera), name,
+                         *player['pos'], *player['size'], segment_width,
+                         len(strings.strings), strings_offset, len(static), static_offset, len(ground), ground_offset,
+                         len(source['dynamic']), dynamic_offset, len(tile_pixels), tiles_offset)
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'wb') as file:
+        for part in [header] + string_table + encoded + [static_data, ground_data, dynamic_data] + tile_table:
+            file.write(part)
+        for pixels, _ in tile_pixels:
+            file.write(pixels)
+        for pixels in images:
+            if pixels:
+                file.write(pixels)
+    os.replace(temporary_path, path)  # a level that's being loaded never sees a half written file
+    logger.info("compiled {} into: {}", source['name'], path)
+
+
+class CompiledLevel:
+    """A compiled level file, mapped into memory. Sections are unpacked from the mapping when they're asked for,
+    and the tiles are handed out as views on it, so nothing is parsed, or copied up front"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.data)
+        (magic, version, self.tile_size, width, height, red, green, blue, camera, name, player_x, player_y,
+         player_width, player_height, self.segment_width, self.string_count, self.strings_offset, self.static_count,
+         self.static_offset, self.ground_count, self.ground_offset, self.dynamic_count, self.dynamic_offset,
+         self.tile_count, self.tiles_offset) = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"not a compiled level of version {FORMAT_VERSION}: {path}")
+        self.size = (width, height)
+        self.colour = (red, green, blue)
+        self.camera_type = None if camera == NO_CAMERA else list(CAMERA_TYPES.values())[camera]
+        self.name = self.string(name)
+        self.player_pos = (player_x, player_y)
+        self.player_size = (player_width, player_height)
+        self.streaming = self.segment_width > 0
+        self.rows = -(-height // self.tile_size)
+
+    def string(self, index):
+        offset, length = STRING.unpack_from(self.data, self.strings_offset + STRING.size * index)
+        return self.data[offset:offset + length].decode()
+
+    def static_components(self):
+        """(type, resource name, position, size, image offset) of every static component, see image()"""
+        for type, resource, x, y, width, height, image in STATIC.iter_unpack(
+                self.view[self.static_offset:self.ground_offset]):
+            yield STATIC_TYPES[type], self.string(resource), (x, y), (width, height), image
+
+    def ground_order(self):
+        """indices of the ground components, in the order of the collision index"""
+        return [index for index, in GROUND.iter_unpack(self.view[self.ground_offset:self.dynamic_offset])]
+
+    def dynamic_components(self):
+        """(type, text, position, size, max time, font size) of every dynamic component"""
+        dynamic = self.view[self.dynamic_offset:self.dynamic_offset + DYNAMIC.size * self.dynamic_count]
+        for type, text, x, y, width, height, max_time, font_size in DYNAMIC.iter_unpack(dynamic):
+            yield DYNAMIC_TYPES[type], self.string(text), (x, y), (width, height), max_time, font_size
+
+    def tile(self, key):
+        """the baked pixels, and the size of a background tile"""
+        column, row = key
+        offset, width, height = TILE.unpack_from(self.data, self.tiles_offset + TILE.size * (column * self.rows + row))
+        return self.view[offset:offset + width * height * 3], (width, height)
+
+    def image(self, offset, size):
+        """the scaled image of a static component, or None when it has none (its offset is 0)"""
+        if not offset:
+            return None
+        width, height = size
+        image = pygame.image.frombuffer(self.view[offset:offset + width * height * 4], size, 'RGBA')
+        if pygame.display.get_surface() is not None:  # converting needs an initialized display
+            image = image.convert_alpha()
+        return image
+
+    def tiled_surface(self):
+        return TiledSurface(self.size, colour=self.colour, tile_size=self.tile_size, baked=self.tile)
+
+
+def compiled_path(level_number, digest):
+    return os.path.join(COMPILED_LEVEL_DIR, f"level_{level_number}-{digest[:16]}.lvl")
+
+
+def stamp_path(level_number):
+    return os.path.join(COMPILED_LEVEL_DIR, f"level_{level_number}.stamp")
+
+
+def read_stamp(level_number):
+    """the stamp of the last compile: the format, the stats of the files it was built from, and their hash"""
+    try:
+        with open(stamp_path(level_number)) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def write_stamp(level_number, files, digest):
+    path = stamp_path(level_number)
+    with open(path + '.tmp', 'w') as file:
+        json.dump({'format': [FORMAT_VERSION, BACKGROUND_TILE_SIZE], 'files': files, 'digest': digest}, file)
+    os.replace(path + '.tmp', path)
+
+
+def load_level(level_number):
+    """returns the compiled level, it's compiled first when it, or what it's built from changed.
+    The files are only read, and hashed when their size, or modification time isn't the one in the stamp"""
+    stamp = read_stamp(level_number)
+    if (stamp is not None and stamp['format'] == [FORMAT_VERSION, BACKGROUND_TILE_SIZE] and
+            file_stats(stamp['files']) == stamp['files']):
+        path = compiled_path(level_number, stamp['digest'])
+        if os.path.exists(path):
+            return CompiledLevel(path)
+    source = read_source(level_number)
+    # the stats are taken before the files are read, so a change meanwhile is found the next time
+    files = file_stats(source_files(level_number, source))
+    digest = source_hash(source)
+    path = compiled_path(level_number, digest)
+    if not os.path.exists(path):
+        os.makedirs(COMPILED_LEVEL_DIR, exist_ok=True)
+        for old in os.listdir(COMPILED_LEVEL_DIR):  # compiled from an older source
+            if old.startswith(f"level_{level_number}-"):
+                os.remove(os.path.join(COMPILED_LEVEL_DIR, old))
+        compile_level(source, path)
+    write_stamp(level_number, files, digest)
+    return CompiledLevel(path)
+
+
+def check_tiles(level_number):
+    """returns the largest difference of a colour between two rows of tiles across the middle of the level, and
+    the same rows with every layer scaled as a whole; the tiles only scale the part of a layer they show"""
+    from levels import Level
+    if numpy is None:
+        raise ImportError("checking the tiles needs numpy")
+    size, background, static = build_static(read_source(level_number))
+    tiles, _ = Level.build_background(size, background=background, static_components=static)
+    top = max(0, size[1] // 2 // tiles.tile_size - 1) * tiles.tile_size
+    strip = pygame.Rect(0, top, size[0], 2 * tiles.tile_size).clip(tiles.rect)
+    composited = pygame.Surface(strip.size)
+    for key in tiles.keys(strip):
+        tile_rect = tiles.tile_rect(key)
+        composited.blit(tiles.compose(key), (tile_rect.left - strip.left, tile_rect.top - strip.top))
+    whole = pygame.Surface(strip.size)
+    whole.fill(tiles.colour)
+    for surface, rect in tiles.layers:
+        if rect.colliderect(strip):
+            whole.blit(surface if surface.get_size() == rect.size else scale(surface, rect.size),
+                       (rect.left - strip.left, rect.top - strip.top))
+    difference = numpy.abs(pygame.surfarray.array3d(composited).astype(int) - pygame.surfarray.array3d(whole))
+    return int(difference.max())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="compiles the levels in " + LEVEL_DATA_DIR)
+    parser.add_argument('levels', nargs='*', type=int, help="level numbers, all levels when none are given")
+    parser.add_argument('--check', action='store_true',
+                        help="compare the background tiles with the layers scaled as a whole")
+    parser.add_argument('--tolerance', type=int, default=BACKGROUND_CHECK_TOLERANCE,
+                        help="largest difference of a colour the check allows")
+    arguments = parser.parse_args()
+    level_numbers = arguments.levels or sorted(
+        int(name[len('level_'):-len('.json')]) for name in os.listdir(LEVEL_DATA_DIR) if name.endswith('.json'))
+    pygame.init()
+    failed = []
+    for level_number in level_numbers:
+        level = load_level(level_number)
+        print(f"level {level_number}: {level.path} ({os.path.getsize(level.path) // 1024} KiB)")
+        if arguments.check:
+            difference = check_tiles(level_number)
+            print(f"  tiles differ from one scaling by at most {difference}")
+            if difference > arguments.tolerance:
+                failed.append(level_number)
+    if failed:
+        print(f"the tiles of level {', '.join(map(str, failed))} don't line up with one scaling")
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,100 +1,178 @@
 from game_components import *
-from graphics import controller as graphics_handler, Camera, complex_camera
+from graphics import controller as graphics_handler, Camera, TiledSurface, complex_camera
+from collisions import SpatialHash, GroundIndex, SegmentedGroundIndex
+from physics import create_physics_backend
+from pool import component_pool
+from registry import ComponentRegistry, CommandBuffer
+from profiler import profiler
+from level_compiler import load_level
+from log import get_logger
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import random
 
+logger = get_logger('levels')
+collision_logger = get_logger('collisions')
+
 # make an Object file, and add all needed resources (based on folder position and file names)
 class Level:
     """A class with image resources, and helper functions"""
+    GROUND_TYPES = (Ground, BuildingBlock)  # static components which characters can stand on
+    KILLS_TO_FINISH = 8
 
+    # populate is a function returning a new player, and dynamic components; it's needed to reset the level
+    # ground_index, and tiles can be given when they're compiled already
     def __init__(self, level_name, player, static_world_components, dynamic_world_components, background=None,
-                 level_size=None, camera_type=None):
+                 level_size=None, camera_type=None, cell_size=COLLISION_CELL_SIZE, populate=None, ground_index=None,
+                 tiles=None):
         if level_size == None:
             level_size = background.size
         self.background = background
         self.size = level_size
         self.name = level_name
-        # a dictionary with all image related game components
-        self.player = player
-        self.characters = []  # starts empty; is filled by npc, and the player(s)
         self.npc = pygame.sprite.Group()
-        self.static_components = static_world_components  # image parts (e.g. background, ground)
-        self.dynamic_components = dynamic_world_components  # image parts (e.g. swings, moving objects, bullets)
-        self.components = [] + self.static_components + self.dynamic_components  # redundant list; fast requesting component
-        self.add_character(player)
+        self.registry = ComponentRegistry(PhysicsEntity, Text, ForeGround)  # every component, by id, and kind
+        self.commands = CommandBuffer()  # adds, and removes during a tick wait for the end of its phase
+        for component in static_world_components:  # image parts (e.g. background, ground)
+            self.registry.add_static(component)
+        # broadphase: moving components (characters, and dynamic components) are re-hashed when they move
+        self.spatial_hash = SpatialHash(cell_size)
+        # ground never moves, so it is compiled once into an index sorted on the x-axis
+        if ground_index is None:
+            ground_index = GroundIndex([component for component in static_world_components
+                                        if type(component) in self.GROUND_TYPES])
+        self.ground_index = ground_index
+        self.pairs_tested = 0  # amount of rectangle pairs tested during the last collision detection
+        self.physics = create_physics_backend(PHYSICS_BACKEND)  # None: every entity moves itself
+        self.camera_type = camera_type
+        self.populate = populate
         # build the static game world
-        self.image, self.rect = self.build_background(level_size, background=background,
-                                                      static_components=self.static_components)
-        if camera_type is not None:
-            self.camera = Camera(camera_type, player.rect, level_size)  # the screen view
-            # todo: decide on who should hold the camera
-            graphics_handler.set_camera(self.camera)  # makes it possible to blit directly to the graphics handler
+        if tiles is None:
+            tiles, _ = self.build_background(level_size, background=background, static_components=static_world_components)
+        self.tiles, self.rect = tiles, tiles.rect.copy()
+        self.start(player, dynamic_world_components)
+        logger.info("level '{}' loaded", level_name)
+
+    def start(self, player, dynamic_world_components):
+        """sets everything that changes while the level is played"""
+        self.player = player
+        self.commands.clear()
+        self.registry.clear_dynamic()  # the characters are filled by npc, and the player(s)
+        self.spatial_hash.clear()
+        for component in dynamic_world_components:  # image parts (e.g. swings, moving objects, bullets)
+            self.registry.add_dynamic(component)
+            self.spatial_hash.insert(component)
+        self.add_character(player)
+        if self.camera_type is not None:
+            self.camera = Camera(self.camera_type, player.rect, self.size)  # the screen view, set by activate
         else:
             self.camera = None
         self.freeze = False  # freezes all updates to components
-        if INFO:
-            print("[LV] image '{}' loaded".format(level_name))
         self.killed_monster = 0
 
+    def reset(self):
+        """starts the level over with a new player, characters, and dynamic components;
+        the baked background, and the static components (and their collision index) are kept"""
+        if self.populate is None:
+            raise ValueError(f"level '{self.name}' can't be reset, it has no populate function")
+        for component in self.registry.dynamic:
+            component_pool.release(component)  # ignores components that didn't come from the pool
+        if self.physics is not None:
+            self.physics.finish_step()
+        self.start(*self.populate())
+        logger.info("level '{}' reset", self.name)
+
     @staticmethod
     def build_background(level_size, background=None, static_components=None, colour=(255, 150, 0)):
+        """returns the tiled level background, and the level rectangle.
+        Tiles are only composited when the camera gets near them"""
         if static_components is None:
             static_components = []
 
-        level = pygame.Surface(level_size)
-        level.fill(colour)
-        level_rect = level.get_rect()
+        level = TiledSurface(level_size, colour=colour)
         if background is not None:
-            level.blit(background.image, background.rect)
-            if INFO:
-                print('[LV] Background blitted in build: {}'.format(background.rect))
+            level.add_layer(background.resource, background.rect)
+            logger.info("background added in build: {}", background.rect)
 
         for placement in [Background, Ground]:  # first blit Background, afterwards Ground
             for component in static_components:
                 # if not self.level_rect.contains(component.rect): continue  # only if component fits in level
                 if type(component) == placement:
-                    level.blit(component.image.convert_alpha(), component.rect)
-        if INFO:
-            print("image surface created: {}".format(level))
-        return level, level_rect
+                    level.add_layer(component.resource, component.rect)
+        logger.info("level surface created: {}", level)
+        return level, level.rect.copy()
+
+    # the components by kind, the lists are shared; they're only built again after a component is added, or removed
+    @property
+    def static_components(self):
+        return self.registry.static.list()
+
+    @property
+    def dynamic_components(self):
+        return self.registry.dynamic.list()
+
+    @property
+    def components(self):
+        """the static, and dynamic components"""
+        return self.registry.components.list()
+
+    @property
+    def characters(self):
+        return self.registry.characters.list()
 
     # game component management)
     def add_world_component(self, world_component):
-        self.static_components.append(world_component)
-        if DEBUG:
-            print("added image to game world: " + repr(world_component.image))
-        self.image.blit(world_component.image, world_component.rect)
-        self.components.append(world_component)
+        self.registry.add_static(world_component)
+        logger.debug("added image to game world: {!r}", world_component.resource)
+        self.tiles.add_layer(world_component.resource, world_component.rect)
+        if type(world_component) in self.GROUND_TYPES:
+            self.ground_index.insert(world_component)
 
     # when adding a dynamic level component to the level, this method should be used exclusively
+    # during a tick, adding and removing is deferred to the end of the tick's phase (see tick)
     def add_component(self, component):
-        self.dynamic_components.append(component)
-        self.components.append(component)
         component.level = self  # can't get sprite groups to work
+        self.commands.run(self._add_component, component)
+
+    def _add_component(self, component):
+        self.registry.add_dynamic(component)
+        self.spatial_hash.insert(component)
 
     def del_component(self, component):
+        self.commands.remove(self._del_component, component)
+
+    # pooled components are handed back to the component pool; characters that are killed are removed as characters
+    def _del_component(self, component):
+        if component in self.registry.characters:
+            self._del_character(component)
+            return
         if type(component) == Player:
             self.player = None
-        try:
-            del self.dynamic_components[self.dynamic_components.index(component)]  # component should have __eq__ overridden
-        except ValueError as ex:
-            if WARNING:
-                print(f"[LL] couldn't find component in dynamic components list {component}")
-        try:
-            del self.components[self.components.index(component)]
-        except ValueError as ex:
-            if WARNING:
-                print(f"[LL] couldn't find component in components list {component}")
+        self.spatial_hash.remove(component)
+        if self.registry.remove_dynamic(component):
+            component_pool.release(component)
+        else:
+            logger.warning("couldn't find component in dynamic components {}", component)
 
     def add_character(self, character):
-        self.characters.append(character)
         if character.TYPE == 'Monster':
             character.enemy = self.player
         character.level = self
+        self.commands.run(self._add_character, character)
+
+    def _add_character(self, character):
+        self.registry.add_character(character)
+        self.spatial_hash.insert(character)
         #self.npc.add(character)
 
     def del_character(self, character):
-        index = self.characters.index(character)
-        del self.characters[index]
+        self.commands.remove(self._del_character, character)
+
+    def _del_character(self, character):
+        if not self.registry.remove_character(character):
+            logger.warning("couldn't find character {}", character)
+            return
+        self.spatial_hash.remove(character)
         if character is self.player:
             self.player = None
         if isinstance(character, Monster):
@@ -105,12 +183,33 @@ class Level:
 
     def get_dynamic_components(self):
         """builds a (flat) list with all dynamic game component"""
-        return [x for x in self.dynamic_components]
+        return list(self.dynamic_components)
 
     def get_game_components(self):
         """Builds a new list with all static and dynamic components"""
         # first get the static components, as these will be blitted over by the dynamic ones
-        return [x for x in self.components]
+        return list(self.components)
+
+    def tick(self, dt):
+        """one simulation step: collisions, and updates for dt milliseconds.
+        Components added, or removed in a phase are added, or removed together when the phase ends (the sync point),
+        so the phases iterate the component lists without copying them"""
+        self.save_positions()
+        with profiler.phase('collisions'), self.commands.deferred():
+            self.detect_collisions()
+        with profiler.phase('update'), self.commands.deferred():
+            self.update(dt)
+
+    # remembers where everything was before a tick, so a frame can be displayed in between ticks
+    def save_positions(self):
+        for component in self.characters + self.dynamic_components:
+            component.previous_pos = component.rect.topleft
+        if self.camera:
+            self.camera.previous_pos = self.camera.rect.topleft
+
+    # switch between the scalar, and the vectorized physics (see physics.PHYSICS_BACKENDS)
+    def set_physics_backend(self, name):
+        self.physics = create_physics_backend(name)
 
     def update(self, dt):
         """update all game components in the current level (does not checks for collisions)"""
@@ -119,10 +218,13 @@ class Level:
         if self.freeze:
             if self.player:
 
-                self.add_component(Text("you can unfreeze the screen with 'f'",
-                                        (self.camera.rect.centerx-80, self.camera.rect.centery-160), (200, 200),
-                                        max_time=1,font_size=25))
+                self.add_component(component_pool.acquire(Text, "you can unfreeze the screen with 'f'",
+                                                          (self.camera.rect.centerx-80, self.camera.rect.centery-160),
+                                                          (200, 200), max_time=1, font_size=25))
             return
+        if self.physics is not None and dt:  # moves everything at once; the updates below skip their movement
+            self.physics.step([character for character in self.characters if character.is_alive()]
+                              + self.dynamic_components, dt)
         for character in self.characters:
             if character.is_alive():
                 character.update(dt)
@@ -130,17 +232,33 @@ class Level:
                 self.del_character(character)
         for component in self.dynamic_components:
             component.update(dt)
+        if self.physics is not None:
+            self.physics.finish_step()
         # update camera as last
         if self.camera and self.player:
             self.camera.update(self.player.rect)
-        if len(self.characters) <= 1:  # there should always be one monster in the game
-            self.add_character(Schagel((random.randint(0, self.size[0]), self.size[1]/2), (58, 52)))
+        if len(self.registry.characters) <= 1:  # there should always be one monster in the game
+            self.add_character(Schagel(self.spawn_position(), (58, 52)))
+
+    # where new monsters are dropped into the level
+    def spawn_position(self):
+        return random.randint(0, self.size[0]), self.size[1]/2
+
+    # the main thread part of loading, the level may have been built on another thread
+    def activate(self):
+        if self.camera is not None:
+            # todo: decide on who should hold the camera
+            graphics_handler.set_camera(self.camera)  # makes it possible to blit directly to the graphics handler
 
     def check_level_finished(self):
-        if self.killed_monster >= 8:
+        if self.killed_monster >= self.KILLS_TO_FINISH:
             return True
         return False
 
+    def progress(self):
+        """how far the level is finished, from 0 to 1"""
+        return min(1, self.killed_monster / self.KILLS_TO_FINISH)
+
     # collision detection per entity that the function is called with
     @staticmethod
     def detect_collision(entity, components):
@@ -149,12 +267,10 @@ class Level:
         for component in components:
             if pygame.sprite.collide_rect(entity, component):
                 if component:  # makes it acceptable to have None in components
-                    if DEBUG:
-                        print("[CD] ground collision!")
+                    collision_logger.debug("ground collision!")
                     return component
                 else:
-                    if DEBUG:
-                        print("[CD] unknown collision: {}".format(component))
+                    collision_logger.debug("unknown collision: {}", component)
 
     @staticmethod
     def detect_entity_collision(entity):
@@ -165,165 +281,354 @@ class Level:
     def find_type_collision(entity, components, component_type):
         for component in components:
             if pygame.sprite.collide_rect(entity, component) and type(component) == component_type:
-                if DEBUG:
-                    print("[CD] {} collision!".format(component_type))
+                collision_logger.debug("{} collision!", component_type)
                 return component
 
+    # counts every narrow-phase rectangle test, so the broadphase can be judged by the pairs it lets through
+    def collide(self, entity, component):
+        self.pairs_tested += 1
+        return pygame.sprite.collide_rect(entity, component)
+
     # calls on_collision on all entities
-    @staticmethod
-    def detect_type_collisions(entities, components, component_types):
-        """detects the collision between all static components, of one or multiple types, and 'entities';
-        calls on_collision on every entity"""
+    def detect_type_collisions(self, entities, index, component_types):
+        """detects the collision between the components, of one or multiple types, in the index
+        (spatial hash, or ground index) and 'entities'; calls on_collision on every entity"""
         for entity in entities:
-            for component in components:
-                if type(component) in component_types and pygame.sprite.collide_rect(entity, component):
-                    if DEBUG:
-                        print(f"[CD] collision: '{entity}', '{component}'!")
+            for component in index.query(entity.rect):
+                if type(component) in component_types and self.collide(entity, component):
+                    collision_logger.debug("collision: '{}', '{}'!", entity, component)
                     component.on_collision(entity)
                     if isinstance(component, PhysicsEntity):
                         entity.on_collision(component)
 
     def detect_characters_ground(self):
         for character in self.characters:
-            for component in self.static_components:
-                if type(component) in [Ground, BuildingBlock] and pygame.sprite.collide_rect(character, component):
-                    if DEBUG: print(f"[CD] ground collision: '{character}', '{component}'!")
+            character.ground = None
+            for component in self.ground_index.query(character.rect):
+                if self.collide(character, component):
+                    collision_logger.debug("ground collision: '{}', '{}'!", character, component)
                     character.on_collision(component)
                     break
-                character.ground = None
 
     # checks collision between all characters with zero double-checks
     def detect_character_collisions(self):
         """Check collision between every character once.
          Calls the collision method on each with as argument the other"""
-        temp = [character for character in self.characters]
         for character0 in self.characters:
-            for character1 in temp:
-                if character0 != character1 and pygame.sprite.collide_rect(character0, character1):
+            for character1 in self.spatial_hash.query(character0.rect):
+                # a pair is only tested from the character with the lowest id
+                if character1.id <= character0.id or not isinstance(character1, Character):
+                    continue
+                if self.collide(character0, character1):
                     character0.on_collision(character1)
                     character1.on_collision(character0)
-                    if DEBUG:
-                        print(f"[LV] collision between: {character0} and {character1}")
-            del temp[0]
+                    collision_logger.debug("collision between: {} and {}", character0, character1)
 
     def detect_characters_out_of_bound(self):
         for character in self.characters:
             if not pygame.sprite.collide_rect(character, self):
                 self.del_character(character)
-                if DEBUG:
-                    print(f"char out of bound: {character}")
+                collision_logger.debug("character out of bound: {}", character)
             if 0 > character.rect.left:
                 character.rect.left = 0
+                self.spatial_hash.update(character)
             elif character.rect.left > self.size[0]: # level x size
                 character.rect.right = self.size[0]
+                self.spatial_hash.update(character)
+
+    # moving components (like thrown vials) that left the level are removed
+    def detect_components_out_of_bound(self):
+        for component in self.registry.projectiles:
+            if not pygame.sprite.collide_rect(component, self):
+                component.kill()
 
     # check collisions for affected parties
     def detect_collisions(self):
-        self.detect_characters_out_of_bound()
-        self.detect_character_collisions()
-        self.detect_characters_ground()
-        self.detect_type_collisions(self.characters, self.dynamic_components, [Vial])
-        self.detect_type_collisions(self.dynamic_components, self.static_components, [Ground])
+        self.pairs_tested = 0
+        with profiler.phase('collisions/out_of_bound'):
+            self.detect_characters_out_of_bound()
+            self.detect_components_out_of_bound()
+        with profiler.phase('collisions/characters'):
+            self.detect_character_collisions()
+        with profiler.phase('collisions/ground'):
+            self.detect_characters_ground()
+        with profiler.phase('collisions/vials'):
+            self.detect_type_collisions(self.characters, self.spatial_hash, [Vial])
+        with profiler.phase('collisions/components_ground'):
+            self.detect_type_collisions(self.dynamic_components, self.ground_index, [Ground])
 
 
     # displays all image components from back- to foreground
-    def display(self):
+    def display(self, alpha=1.0):
         """calls display on every component;
-        blitting them, and adding their rectangle to a dirty rectangles list"""
+        blitting them, and adding their rectangle to a dirty rectangles list.
+        alpha is how far (0 to 1) the frame is from the previous tick to the last tick"""
         # first put the background on the display
         if self.camera is None:
             camera_rect = None
         else:
-            camera_rect = self.camera.rect
+            camera_rect = self.camera.interpolated_rect(alpha)
 
-        graphics_controller.blit(self.image, self.rect, self.camera.rect) # display level base image
+        graphics_controller.blit_tiled(self.tiles, camera_rect)  # display the level base image around the camera
         for dynamic_component in self.dynamic_components:  # things like throw-ables
-            dynamic_component.display(camera_rect)
+            dynamic_component.display(camera_rect, alpha)
         for character in self.characters:  # player and NPCs
-            character.display(camera_rect)
-        for static_component in self.static_components:  # foreground is the last to be displayed
-            if type(static_component) == ForeGround:
-                static_component.display(camera_rect)
+            character.display(camera_rect, alpha)
+        for foreground_component in self.registry.foreground:  # foreground is the last to be displayed
+            foreground_component.display(camera_rect)
 
     def end(self):
         self.freeze = True
-        self.add_component(Text("End Of Game", (self.camera.rect.centerx, self.size[1] / 2), (100, 50), font_size=30))
+        self.add_component(component_pool.acquire(Text, "End Of Game", (self.camera.rect.centerx, self.size[1] / 2),
+                                                  (100, 50), font_size=30))
 
     def __del__(self):
-        graphics_handler.unset_camera()
-        if INFO:
-            print("[LL] image '{}' unloaded".format(self.name))
-
-
-
-# component order matters!
+        if graphics_handler.camera is self.camera:  # the next level may have set its camera already
+            graphics_handler.unset_camera()
+        logger.info("level '{}' unloaded", self.name)
+
+
+class Segment:
+    """A horizontal part of a streaming level, with the static components, and background tiles built for it"""
+
+    def __init__(self, index, rect, components, tiles, generation):
+        self.index = index
+        self.rect = rect
+        self.components = components  # record index: static component, only the ones that weren't loaded yet
+        self.tiles = tiles  # (column, row): composited tile
+        self.generation = generation  # of the layers the tiles were composited from
+
+
+class StreamingLevel(Level):
+    """A level split into horizontal segments, of which only the ones around the camera are loaded.
+    Segments coming into view are built on a worker thread, and the ones left behind are dropped;
+    monsters in a segment that isn't loaded are frozen, until it's loaded again.
+    Memory, and the work per tick depend on the segment width, instead of the length of the level"""
+    executor = ThreadPoolExecutor(max_workers=1)  # builds the segments of every streaming level
+
+    # static_records are the (type, resource name, position, size, image) of every static component,
+    # images(image, size) returns the scaled image of a record
+    def __init__(self, level_name, player, static_records, dynamic_world_components, level_size, tiles,
+                 segment_width, images, camera_type=None, populate=None, radius=LEVEL_SEGMENT_RADIUS):
+        self.static_records = static_records
+        self.images = images
+        self.segment_width = segment_width
+        self.radius = radius  # segments loaded on both sides of the camera
+        self.segment_records = {}  # segment index: indices of the static records overlapping it
+        for record, (component_type, _, (x, _), (width, _), _) in enumerate(static_records):
+            if component_type is Background:  # baked into the tiles, nothing else uses it
+                continue
+            for index in range(max(0, x // segment_width), max(0, (x + width - 1) // segment_width) + 1):
+                self.segment_records.setdefault(index, []).append(record)
+        self.segments = {}  # segment index: loaded segment
+        self.builds = {}  # segment index: future of a segment that's being built
+        self.resident = {}  # record index: [static component, amount of loaded segments it overlaps]
+        self.frozen = {}  # segment index: monsters in it as (type, position, size, life points)
+        tiles.margin = segment_width * radius  # the camera keeps the tiles of the loaded segments
+        super().__init__(level_name, player, [], dynamic_world_components, level_size=level_size,
+                         camera_type=camera_type, populate=populate,
+                         ground_index=SegmentedGroundIndex(segment_width), tiles=tiles)
+        self.stream(wait=True)
+
+    def start(self, player, dynamic_world_components):
+        self.frozen = {}  # monsters of the last play through
+        super().start(player, dynamic_world_components)
+
+    def reset(self):
+        super().reset()
+        self.stream(wait=True)  # the player starts over, where the segments were likely dropped
+
+    def tick(self, dt):
+        with profiler.phase('streaming'):
+            self.stream()
+        super().tick(dt)
+
+    def segment_index(self, x):
+        return int(x // self.segment_width)
+
+    def segments_around(self, margin):
+        """the segments overlapping the camera (or the player without one), widened by margin pixels on both sides"""
+        if self.camera is not None:
+            rect = self.camera.rect
+        elif self.player is not None:
+            rect = self.player.rect
+        else:
+            return set(self.segments)
+        area = rect.inflate(margin * 2, 0).clip(self.rect)
+        first = self.segment_index(area.left)
+        return set(range(first, max(first, self.segment_index(area.right - 1)) + 1))
+
+    def stream(self, wait=False):
+        """starts building the segments coming into view, adds the ones that are built, and drops the others.
+        Segments in view are built before it returns, when the worker didn't get to them in time; with wait all are"""
+        visible = self.segments_around(0)
+        wanted = self.segments_around(self.segment_width * self.radius)
+        for index in sorted(wanted):
+            if index in self.segments:
+                continue
+            if wait or index in visible:
+                build = self.builds.pop(index, None)
+                self.attach(build.result() if build is not None else self.build_segment(index))
+            elif index not in self.builds:
+                self.builds[index] = self.executor.submit(self.build_segment, index)
+        for index, build in list(self.builds.items()):
+            if build.done():
+                del self.builds[index]
+                if index in wanted:  # it may have gone out of view while it was built
+                    self.attach(build.result())
+        for index in [index for index in self.segments if index not in wanted]:
+            self.detach(index)
+        self.freeze_monsters()
+
+    # the worker thread part: decoding, and scaling the static components, and compositing the background tiles
+    def build_segment(self, index):
+        rect = pygame.Rect(index * self.segment_width, 0, self.segment_width, self.size[1]).clip(self.rect)
+        components = {record: self.build_component(record) for record in self.segment_records.get(index, ())
+                      if record not in self.resident}  # loaded for a neighbour already
+        generation = self.tiles.generation
+        tiles = {key: self.tiles.compose(key) for key in self.tiles.keys(rect)}
+        logger.debug("segment {} built: {} components, {} tiles", index, len(components), len(tiles))
+        return Segment(index, rect, components, tiles, generation)
+
+    def build_component(self, record):
+        component_type, resource_name, pos, size, image = self.static_records[record]
+        return component_type(resource_name, pos, size=size, image=self.images(image, size))
+
+    def attach(self, segment):
+        """adds a built segment to the level"""
+        ground = []
+        for record in self.segment_records.get(segment.index, ()):
+            resident = self.resident.get(record)
+            if resident is None:
+                component = segment.components.get(record)
+                if component is None:  # its neighbour was dropped while the segment was built
+                    component = self.build_component(record)
+                resident = self.resident[record] = [component, 0]
+                self.registry.add_static(component)
+            resident[1] += 1
+            if type(resident[0]) in self.GROUND_TYPES:
+                ground.append(resident[0])
+        self.ground_index.add(segment.index, GroundIndex(ground))
+        self.tiles.add_tiles(segment.tiles, segment.generation)
+        segment.components = segment.tiles = None  # handed over to the level
+        self.segments[segment.index] = segment
+        self.thaw_monsters(segment.index)
+        logger.debug("segment {} loaded", segment.index)
+
+    def detach(self, index):
+        """drops a segment, and the static components no other loaded segment overlaps"""
+        segment = self.segments.pop(index)
+        for record in self.segment_records.get(index, ()):
+            resident = self.resident[record]
+            resident[1] -= 1
+            if not resident[1]:
+                del self.resident[record]
+                self.registry.remove_static(resident[0])
+        self.ground_index.remove(index)
+        self.tiles.release(segment.rect)
+        logger.debug("segment {} dropped", index)
+
+    def freeze_monsters(self):
+        """takes the monsters outside of the loaded segments out of the level, and keeps what's needed to restore them"""
+        for character in [character for character in self.characters if isinstance(character, Monster)]:
+            index = self.segment_index(character.rect.centerx)
+            if index not in self.segments:
+                self.registry.remove_character(character)
+                self.spatial_hash.remove(character)
+                self.frozen.setdefault(index, []).append((type(character), character.rect.topleft, character.size,
+                                                          character.life_points))
+
+    def thaw_monsters(self, index):
+        for monster_type, pos, size, life_points in self.frozen.pop(index, ()):
+            monster = monster_type(pos, size)
+            monster.life_points = life_points
+            self.add_character(monster)
+
+    # monsters are dropped into the loaded segments
+    def spawn_position(self):
+        left = min(self.segments) * self.segment_width
+        right = min((max(self.segments) + 1) * self.segment_width, self.size[0])
+        return random.randint(left, right), self.size[1]/2
+
+
+# levels are described in level_data/, and compiled by level_compiler
 def level_builder(level_number):
     graphics_controller.init_screen()
-    # any component that is part of the level should be added to world_components list
-    static_level_components = []  # additional dynamic blocks and other level_number components
-    dynamic_level_components = []
-    background_pos = (0, 0)
-    level_size = None
-    player_size = (82, 64)
-    camera_type = complex_camera
-    player_pos = (50, 50)
-    if level_number == -1:  # testing
-        level_size = (1920,1080)
-        graphics_controller.init_screen()
-        level_name = 'forest'
-        player = Player((50, 50), size=player_size)  # player and it's starting position in the level_number
-        ground_pos = 500
-        static_level_components.append(Ground('forest_ground01', (0, ground_pos)))
-        static_level_components.append(Ground('forest_ground02', pos=(850, ground_pos)))
-        dynamic_level_components.append(Text(MOVEMENT_INSTRUCTIONS, (100, 200), (300, 100), 1000))
-
-        static_level_components.append(ForeGround('forest_grass01', (100,-80), size=(0, 0)))
-    elif level_number == 0:
-        level_name = 'forest'
-        ground_pos = 500
-        static_level_components.append(Ground('forest_ground01', (0, ground_pos)))
-        static_level_components.append(Ground('forest_ground02', (850, ground_pos)))
-        dynamic_level_components.append(Text(MOVEMENT_INSTRUCTIONS, (100, 100), (300, 100), 10000))
-
-        # dynamic_level_components
-    elif level_number == 2: #forest
-        level_size = (3840, 1080)
-        level_name = 'forest'
-
-        static_level_components.append(Ground('forest_ground01', (-20, 770), size=(800, 200)))
-
-        static_level_components.append(Ground('forest_ground02', (950, 770), size=(600, 200)))
-
-        static_level_components.append(Ground('forest_ground01', (1550, 770), size=(800, 200)))
-
-        static_level_components.append(Ground('forest_ground02', (1550+800, 770), size=(600, 200)))
-
-        dynamic_level_components.append(Text(MOVEMENT_INSTRUCTIONS, (100, 400), (300, 770), max_time=60))
-
-    elif level_number == 1: #lab
-        level_size = (1920, 1080)
-        level_name = 'lab'
-        ground_pos = 500
-        static_level_components.append(Ground('forest_ground02', (-50, 800), size=(450, 350)))
-
-        static_level_components.append(Ground('forest_ground02', (450, 800), size=(600, 350)))
-
-
-        static_level_components.append(Ground('forest_ground02', (1060, 800), size=(500, 350)))
-
-
-
-        static_level_components.append(Ground('forest_ground02', (1300, 800), size=(450, 350)))
-
-        static_level_components.append(Background('lab_stuff01', (600, 470), size=(450, 350)))
-
-        dynamic_level_components.append(Text(MOVEMENT_INSTRUCTIONS, (100, 400), (300, 100), max_time=60))
-
+    compiled = load_level(level_number)  # compiled first, when the level file, or its resources changed
+    # decoded together, instead of one after the other by the characters; the static components don't need theirs,
+    # the compiled level has their images, and the background tiles
+    graphics_controller.resources.load(Character.find_resource_names(Player.TYPE) +
+                                       Character.find_resource_names(Schagel.__name__))
+    # functions creating the components, so the level can create them again on reset
+    dynamic_level_components = [partial(component_type, text, pos, size, max_time, font_size)
+                                for component_type, text, pos, size, max_time, font_size in compiled.dynamic_components()]
+
+    # the part of the level that changes while it's played
+    def populate():
+        player = Player(compiled.player_pos, size=compiled.player_size)  # player and it's starting position
+        return player, [create() for create in dynamic_level_components]
+
+    player, dynamic_components = populate()
+    if compiled.streaming:  # the static components are built per segment, when the camera gets near
+        return StreamingLevel(compiled.name, player, list(compiled.static_components()), dynamic_components,
+                              compiled.size, compiled.tiled_surface(), compiled.segment_width, compiled.image,
+                              camera_type=compiled.camera_type, populate=populate)
+    static_level_components = [component_type(resource_name, pos, size=size, image=compiled.image(image, size))
+                               for component_type, resource_name, pos, size, image in compiled.static_components()]
+    ground_index = GroundIndex([static_level_components[index] for index in compiled.ground_order()], presorted=True)
+    return Level(compiled.name, player, static_level_components, dynamic_components, level_size=compiled.size,
+                 camera_type=compiled.camera_type, populate=populate, ground_index=ground_index,
+                 tiles=compiled.tiled_surface())
+
+
+# the worker thread part of loading: decoding, scaling, and compositing the background tiles the level starts with
+def build_level(level_number):
+    level = level_builder(level_number)
+    if level.camera is not None:
+        level.tiles.prefetch(level.camera.rect)
+    return level
+
+
+class LevelLoader:
+    """Builds levels on a worker thread, so the next level can be built while the current one is played.
+    A built level is taken, and activated on the main thread"""
+
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.builds = {}  # level number: future of the built level
+        self.levels = {}  # level number: the level that's played, it's reset instead of built again
+
+    def prefetch(self, level_number):
+        """starts building a level, if it isn't built, or being built already"""
+        if level_number not in self.builds and level_number not in self.levels:
+            graphics_handler.init_screen()  # the display belongs to the main thread
+            logger.info("building level {} in the background", level_number)
+            self.builds[level_number] = self.executor.submit(build_level, level_number)
+
+    def ready(self, level_number):
+        build = self.builds.get(level_number)
+        return level_number in self.levels or build is not None and build.done()
+
+    def take(self, level_number):
+        """returns the level at its start; waits for the build when it isn't done yet.
+        Only the level that's taken is kept, the levels played before it are dropped"""
+        for played in [number for number in self.levels if number != level_number]:
+            self.forget(played)
+        level = self.levels.get(level_number)
+        if level is not None:  # played before
+            level.reset()
+            return level
+        self.prefetch(level_number)
+        level = self.builds.pop(level_number).result()
+        self.levels[level_number] = level
+        return level
+
+    def forget(self, level_number=None):
+        """drops a cached level, or all of them"""
+        if level_number is None:
+            self.levels.clear()
+        else:
+            self.levels.pop(level_number, None)
 
-    else:
-        raise NotImplementedError(f"Level value hasn't been implemented! {level_number}")
 
-    background = Background(level_name, background_pos, level_size)
-    player = Player(player_pos, size=player_size)  # player and it's starting position in the level_number
-    return Level(level_name, player, static_level_components, dynamic_level_components, background=background,
-                 level_size=level_size, camera_type=camera_type)
+level_loader = LevelLoader()
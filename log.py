@@ -0,0 +1,150 @@
+# logging per subsystem (category), written to the terminal by a thread, so the game never waits on it.
+# A message is only formatted when its category logs its level, a disabled call costs a comparison:
+#   logger = log.get_logger('physics')
+#   logger.debug("{} moved: {}", entity, (dx, dy))
+# Levels can be changed while the game runs with set_level, or with --log category=level (main.py)
+
+import atexit
+import sys
+import threading
+from collections import deque
+from time import perf_counter
+
+from configurations import *
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+OFF = 100
+LEVELS = {'debug': DEBUG, 'info': INFO, 'warning': WARNING, 'error': ERROR, 'off': OFF}
+LEVEL_NAMES = {value: name for name, value in LEVELS.items()}
+
+
+def level_value(level):
+    """a level name ('debug', 'info', 'warning', 'error', 'off'), or value as a value"""
+    if isinstance(level, str):
+        try:
+            return LEVELS[level.lower()]
+        except KeyError:
+            raise ValueError(f"unknown log level: {level}, levels are: {', '.join(LEVELS)}") from None
+    return level
+
+
+class LogWriter:
+    """Writes the formatted messages from a ring buffer on a daemon thread.
+    When the buffer is full the oldest messages are dropped, and counted, instead of blocking the game"""
+
+    def __init__(self, size=LOG_BUFFER_SIZE, stream=None):
+        self.lines = deque(maxlen=size)
+        self.stream = stream  # None: standard output at the time of writing
+        self.dropped = 0
+        self.written = 0
+        self.wake = threading.Event()
+        self.lock = threading.Lock()  # the thread, and flush write in turns
+        self.thread = None
+
+    def write(self, line):
+        if len(self.lines) == self.lines.maxlen:
+            self.dropped += 1
+        self.lines.append(line)
+        if self.thread is None:
+            self.start()
+        self.wake.set()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='log writer', daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            self.wake.wait()
+            self.wake.clear()
+            self.flush()
+
+    def flush(self):
+        """writes every buffered message on this thread"""
+        with self.lock:
+            stream = self.stream or sys.stdout
+            if self.dropped:
+                dropped, self.dropped = self.dropped, 0
+                stream.write(f"[log] {dropped} messages dropped, the log buffer was full\n")
+            while self.lines:
+                stream.write(self.lines.popleft() + '\n')
+                self.written += 1
+            stream.flush()
+
+
+class Logger:
+    """The messages of one category, which are logged from its level up"""
+    __slots__ = ('category', 'level')
+
+    def __init__(self, category, level):
+        self.category = category
+        self.level = level
+
+    def __repr__(self):
+        return f"logger '{self.category}': {LEVEL_NAMES.get(self.level, self.level)}"
+
+    def enabled(self, level):
+        """for messages of which the arguments themselves are expensive"""
+        return level >= self.level
+
+    def log(self, level, message, *args):
+        if level >= self.level:
+            if args:
+                message = message.format(*args)
+            writer.write(f"{perf_counter() - START:9.3f} {LEVEL_NAMES[level]:<7} [{self.category}] {message}")
+
+    # message is a str.format template, it's only formatted with args when the message is logged
+    def debug(self, message, *args):
+        if DEBUG >= self.level:
+            self.log(DEBUG, message, *args)
+
+    def info(self, message, *args):
+        if INFO >= self.level:
+            self.log(INFO, message, *args)
+
+    def warning(self, message, *args):
+        if WARNING >= self.level:
+            self.log(WARNING, message, *args)
+
+    def error(self, message, *args):
+        if ERROR >= self.level:
+            self.log(ERROR, message, *args)
+
+
+START = perf_counter()
+writer = LogWriter()
+default_level = level_value(LOG_LEVEL)
+override = None  # level set for every category with set_level, it wins over LOG_LEVELS
+loggers = {}  # category: logger
+
+
+def get_logger(category):
+    """the logger of a category, there's one per category"""
+    logger = loggers.get(category)
+    if logger is None:
+        level = override if override is not None else level_value(LOG_LEVELS.get(category, default_level))
+        logger = loggers[category] = Logger(category, level)
+    return logger
+
+
+def set_level(category, level):
+    """changes the level of a category while the game runs; category None changes every category,
+    also the ones that are made later"""
+    global default_level, override
+    level = level_value(level)
+    if category is None:
+        default_level = override = level
+        for logger in loggers.values():
+            logger.level = level
+    else:
+        get_logger(category).level = level
+
+
+def flush():
+    writer.flush()
+
+
+atexit.register(flush)  # messages still in the buffer when the game quits
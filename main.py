@@ -1,6 +1,7 @@
-import sys, time
+import argparse, os, sys, time
 from threading import Thread
 
+import log
 from game import Game
 
 
@@ -42,6 +43,30 @@ def main():
     #exit()
     #display_level1(int(input("which level number to display: "))) # only inits level, and displays it
 
+    parser = argparse.ArgumentParser(description="Mad Salts")
+    parser.add_argument('--headless', action='store_true',
+                        help="only run the simulation, without a window, and report the ticks per second")
+    parser.add_argument('--ticks', type=int, default=1000, help="amount of ticks to simulate headless")
+    parser.add_argument('--level', type=int, default=1, help="level to simulate headless")
+    parser.add_argument('--log', action='append', default=[], metavar='[CATEGORY=]LEVEL',
+                        help="log level of a category (physics, graphics, player, ...), or of every category; "
+                             "can be given more than once")
+    arguments = parser.parse_args()
+    for setting in arguments.log:
+        category, _, level = setting.rpartition('=')
+        try:
+            log.set_level(category or None, level)
+        except ValueError as ex:
+            parser.error(str(ex))
+
+    if arguments.headless:
+        # SDL reads these when pygame is initialized by Game
+        os.environ['SDL_VIDEODRIVER'] = 'dummy'
+        os.environ['SDL_AUDIODRIVER'] = 'dummy'
+        game = Game()
+        game.run_headless(arguments.level, arguments.ticks)
+        return
+
     game = Game()
     #Thread(target=simulate_input, args=[game]).start()
     game.launch()
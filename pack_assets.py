@@ -0,0 +1,154 @@
+#!/bin/python3
+
+# asset pack: every resource decoded once, and written into one file of raw pixels with an index in front.
+# At runtime the pack is mapped into memory, and surfaces are made on top of the pixels without decoding anything.
+# Pixels with alpha are stored in the byte order of the display (BGRA on most), so converting them is a plain copy.
+# Resources that changed after packing (or aren't packed) are decoded from their PNG, like during development.
+#
+# usage: python pack_assets.py [--compare]  (compare: times loading every resource with, and without the pack)
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+from time import perf_counter
+
+import pygame
+
+from log import get_logger
+from configurations import *
+
+logger = get_logger('graphics')
+
+MAGIC = b'MSAP'
+FORMAT_VERSION = 1
+FORMATS = ['BGRA', 'RGBA', 'RGB']  # the format codes are the positions in this list
+BGRA_MASKS = (0xff0000, 0xff00, 0xff, 0xff000000)  # masks of a surface which has its bytes in BGRA order
+
+# file layout, little endian: the header, an entry per resource, the names, and the pixels
+HEADER = struct.Struct('<4sHxxI')  # magic, version, amount of entries
+ENTRY = struct.Struct('<IIQIIBxxxQq')  # name offset, name length, pixels offset, width, height, format,
+                                       # size, and modification time (ns) of the PNG it was decoded from
+
+
+def source_stamp(path):
+    """the size, and modification time of a file; a packed resource is used while its file has the same stamp"""
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def pixels(surface):
+    """the pixels of a surface, and their format; with per-pixel alpha in the format of the display when possible"""
+    if not surface.get_flags() & pygame.SRCALPHA:
+        return pygame.image.tostring(surface, 'RGB'), 'RGB'
+    converted = surface.convert_alpha()
+    if converted.get_masks() == BGRA_MASKS and converted.get_pitch() == converted.get_width() * 4:
+        return converted.get_buffer().raw, 'BGRA'
+    return pygame.image.tostring(surface, 'RGBA'), 'RGBA'
+
+
+def pack_assets(paths, file_name=ASSET_PACK):
+    """decodes the resources (name: file path), and writes their pixels to file_name; returns the packed bytes.
+    The display has to be initialized"""
+    names = sorted(paths)
+    encoded = [name.encode() for name in names]
+    names_offset = HEADER.size + ENTRY.size * len(names)
+    offset = names_offset + sum(len(name) for name in encoded)
+    entries, packed = [], []
+    name_offset = names_offset
+    for name, name_bytes in zip(names, encoded):
+        surface = pygame.image.load(paths[name])
+        data, pixel_format = pixels(surface)
+        entries.append(ENTRY.pack(name_offset, len(name_bytes), offset, *surface.get_size(),
+                                  FORMATS.index(pixel_format), *source_stamp(paths[name])))
+        packed.append(data)
+        name_offset += len(name_bytes)
+        offset += len(data)
+
+    temporary_path = file_name + '.tmp'
+    with open(temporary_path, 'wb') as file:
+        for part in [HEADER.pack(MAGIC, FORMAT_VERSION, len(names))] + entries + encoded + packed:
+            file.write(part)
+    os.replace(temporary_path, file_name)  # a game that's starting never sees a half written pack
+    logger.info("packed {} resources into: {} ({} KiB)", len(names), file_name, offset // 1024)
+    return offset
+
+
+class AssetPack:
+    """An asset pack, mapped into memory. Surfaces are views on the mapping, so they are read only"""
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        with open(file_name, 'rb') as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.data)
+        magic, version, count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"not an asset pack of version {FORMAT_VERSION}: {file_name}")
+        self.entries = {}  # name: (pixels offset, size, format, stamp)
+        for index in range(count):
+            name_offset, name_length, offset, width, height, pixel_format, size, mtime = ENTRY.unpack_from(
+                self.data, HEADER.size + ENTRY.size * index)
+            name = self.data[name_offset:name_offset + name_length].decode()
+            self.entries[name] = (offset, (width, height), FORMATS[pixel_format], (size, mtime))
+
+    def __repr__(self):
+        return f"asset pack: {self.file_name}, {len(self.entries)} resources"
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def current(self, paths):
+        """the names of the packed resources of which the file didn't change since packing"""
+        return {name for name, path in paths.items()
+                if name in self.entries and self.entries[name][3] == source_stamp(path)}
+
+    def surface(self, name):
+        offset, size, pixel_format, _ = self.entries[name]
+        length = size[0] * size[1] * len(pixel_format)
+        return pygame.image.frombuffer(self.view[offset:offset + length], size, pixel_format)
+
+
+def open_pack(file_name=ASSET_PACK):
+    """returns the asset pack, or None when it hasn't been built, or is of another version"""
+    if not os.path.exists(file_name):
+        return None
+    try:
+        return AssetPack(file_name)
+    except ValueError as ex:
+        logger.warning("{}, the resources are decoded from their files", ex)
+        return None
+
+
+def time_loading(resources):
+    """milliseconds to load every resource, and to load, and convert every resource to the display format"""
+    start = perf_counter()
+    surfaces = [resources._decode(name) for name in resources]
+    loaded = perf_counter()
+    for surface in surfaces:
+        surface.convert_alpha()
+    return (loaded - start) * 1000, (perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="packs the resources into one file of decoded pixels")
+    parser.add_argument('--compare', action='store_true', help="time loading the resources with, and without it")
+    arguments = parser.parse_args()
+
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')  # converting needs a display, not a window
+    from graphics import controller, ResourceManager  # graphics imports the pack reader from here
+    pygame.init()
+    controller.init_screen()
+    pack_assets(controller.resources.paths)
+    if arguments.compare:
+        loose = ResourceManager(controller.RESOURCE_DIRS, pack=None)
+        packed = ResourceManager(controller.RESOURCE_DIRS, pack=open_pack())
+        for name, resources in [('png files', loose), ('asset pack', packed)]:
+            load, convert = min(time_loading(resources) for _ in range(3))
+            print(f"{name:>10}: {len(resources)} resources loaded in {load:.1f} ms, {convert:.1f} ms with converting")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
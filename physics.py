@@ -0,0 +1,128 @@
+# physics backends
+# the scalar backend is every entity calling its own physics_movement, the numpy backend integrates all entities
+# of a level at once. Gameplay code keeps changing the speed, and acceleration members of the entities directly,
+# so the numpy backend gathers them into contiguous arrays every tick, and writes the results back
+
+from operator import attrgetter
+
+try:
+    import numpy
+except ImportError:  # numpy is optional, the scalar backend always works
+    numpy = None
+
+from game_components import PhysicsEntity, Vial, GRAVITY
+from log import get_logger
+from configurations import *
+
+logger = get_logger('physics')
+
+PHYSICS_BACKENDS = ['scalar', 'numpy']
+
+
+def create_physics_backend(name):
+    """returns a backend for Level.physics, None is the scalar backend"""
+    if name == 'scalar':
+        return None
+    elif name == 'numpy':
+        return NumpyPhysics()
+    raise ValueError(f"Physics backend not supported: {name}")
+
+
+class NumpyPhysics:
+    """Integrates the entities of a level in one vectorized step per tick.
+    Only entities which use a physics_movement this backend has a kernel for are integrated,
+    the others are left to their own physics_movement"""
+
+    def __init__(self):
+        if numpy is None:
+            raise ImportError("the numpy physics backend needs numpy")
+        # physics_movement implementation: vectorized version of it
+        self.kernels = {PhysicsEntity.physics_movement: self.integrate_entities,
+                        Vial.physics_movement: self.integrate_vials}
+        self.type_kernels = {}  # entity type: kernel, or None
+        self.integrated = []  # entities integrated during the last step
+
+    def kernel(self, entity_type):
+        if entity_type not in self.type_kernels:
+            self.type_kernels[entity_type] = self.kernels.get(getattr(entity_type, 'physics_movement', None))
+        return self.type_kernels[entity_type]
+
+    def step(self, entities, dt):
+        """integrates all entities with a kernel, and marks them, so their own physics_movement is skipped"""
+        groups = {}
+        for entity in entities:
+            kernel = self.kernel(type(entity))
+            if kernel is not None:
+                groups.setdefault(kernel, []).append(entity)
+        self.integrated = []
+        for kernel, group in groups.items():
+            kernel(group, dt)
+            for entity in group:
+                entity.integrated = True
+            self.integrated += group
+
+    # entities that didn't get their update (e.g. removed during the tick) mustn't skip their next movement
+    def finish_step(self):
+        for entity in self.integrated:
+            entity.integrated = False
+        self.integrated = []
+
+    # one row per entity, one column per member
+    @staticmethod
+    def _gather(entities, *members):
+        get = attrgetter(*members)
+        return numpy.array([get(entity) for entity in entities], dtype=float).reshape(len(entities), len(members)).T
+
+    def integrate_entities(self, entities, dt):
+        """vectorized PhysicsEntity.physics_movement"""
+        x_speed, y_speed, x_accel, y_accel, direction, x_max_speed, jump_speed = self._gather(
+            entities, 'x_speed', 'y_speed', 'x_accel', 'y_accel', 'direction', 'X_MAX_SPEED', 'JUMP_SPEED')
+        get_state = attrgetter('jumping', 'ground')
+        states = [get_state(entity) for entity in entities]
+        jumping = numpy.array([bool(jumping) for jumping, _ in states])
+        grounded = numpy.array([ground is not None for _, ground in states])
+        grounded_truth = numpy.array([bool(ground) for _, ground in states])
+
+        # entities standing still on the ground aren't moved at all
+        moving = jumping | ~grounded | (x_accel != 0) | (x_speed != 0) | (y_accel != 0) | (y_speed != 0)
+
+        # x: speed up by the acceleration, which is used up; without acceleration the entity slows down
+        accelerating = x_accel != 0
+        speed_up = x_speed + numpy.sign(x_accel)
+        speed_up = numpy.minimum(numpy.abs(x_accel + speed_up), x_max_speed) * numpy.sign(speed_up)
+        slowing_down = ~accelerating & (x_speed != 0)
+        slow_down = x_speed - numpy.minimum(numpy.abs(x_speed), x_max_speed * (dt / 1000)) * numpy.sign(x_speed)
+        new_x_speed = numpy.where(accelerating, speed_up, numpy.where(slowing_down, slow_down, x_speed))
+        new_x_accel = numpy.where(accelerating, x_accel - direction, x_accel)
+
+        # y: jumping off the ground, rising, or falling
+        jump = jumping & grounded_truth
+        rising = jumping & ~grounded_truth & (y_speed < 0)
+        landing = jumping & ~grounded_truth & (y_speed >= 0)
+        new_y_speed = numpy.where(jump, -jump_speed,
+                                  numpy.where(rising, y_speed + GRAVITY * (dt / 60),
+                                              numpy.where(jumping, y_speed,
+                                                          numpy.where(grounded_truth, 0, y_speed + GRAVITY))))
+
+        # write back, the rectangles round the movement themselves, so both backends end up on the same pixel
+        moved = 0
+        for entity, move, x_s, y_s, x_a, land in zip(entities, moving.tolist(), new_x_speed.tolist(),
+                                                   new_y_speed.tolist(), new_x_accel.tolist(), landing.tolist()):
+            if move:
+                entity.x_speed, entity.y_speed, entity.x_accel = x_s, y_s, x_a
+                if land:
+                    entity.jumping = False
+                entity.rect.move_ip(x_s, y_s)
+                entity._moved()
+                moved += 1
+        logger.debug("numpy step: {} entities, {} moved", len(entities), moved)
+
+    def integrate_vials(self, vials, dt):
+        """vectorized Vial.physics_movement"""
+        x_speed, y_speed = self._gather(vials, 'x_speed', 'y_speed')
+        x_speed = x_speed - numpy.sign(x_speed)
+        y_speed = y_speed + 1
+        for vial, x_s, y_s in zip(vials, x_speed.tolist(), y_speed.tolist()):
+            vial.x_speed, vial.y_speed = x_s, y_s
+            vial.rect.move_ip(x_s, y_s)
+            vial._moved()
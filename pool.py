@@ -0,0 +1,69 @@
+# recycling of game components
+# a released component keeps its prepared image; on acquire it only gets its state reset by reinit
+
+from configurations import *
+
+
+class ComponentPool:
+    """Free lists of released game components.
+    A component type can be pooled when it implements:
+     pool_key(*args, **kwargs): a classmethod returning which released components can be reused for these arguments
+     reinit(*args, **kwargs): resets everything __init__ sets, except the image"""
+
+    def __init__(self, caps=None, default_cap=POOL_SIZE):
+        self.free = {}  # pool key: released components
+        self.caps = dict(caps or {})  # type name: maximum amount of released components kept
+        self.default_cap = default_cap
+        self.sizes = {}  # type name: amount of released components kept
+        self.hits = {}  # type name: acquires served by a released component
+        self.misses = {}  # type name: acquires that constructed a new component
+
+    def __repr__(self):
+        return "pool: " + ", ".join(f"{name}: {hits}/{misses}/{size}" for name, (hits, misses, size)
+                                    in self.statistics().items())
+
+    def set_cap(self, component_type, cap):
+        self.caps[component_type.__name__] = cap
+
+    def acquire(self, component_type, *args, **kwargs):
+        """returns a recycled component if one fits the arguments, otherwise a new one"""
+        name = component_type.__name__
+        key = component_type.pool_key(*args, **kwargs)
+        free = self.free.get(key)
+        if free:
+            component = free.pop()
+            self.sizes[name] -= 1
+            component.reinit(*args, **kwargs)
+            self.hits[name] = self.hits.get(name, 0) + 1
+        else:
+            component = component_type(*args, **kwargs)
+            self.misses[name] = self.misses.get(name, 0) + 1
+        component.pooled = True  # it goes back to the pool when it's removed
+        component.pool_slot = key
+        return component
+
+    def release(self, component):
+        """takes back a component that was acquired, returns whether it is kept for reuse"""
+        if not getattr(component, 'pooled', False):  # not acquired, or already released
+            return False
+        component.pooled = False
+        name = type(component).__name__
+        if self.sizes.get(name, 0) >= self.caps.get(name, self.default_cap):
+            return False
+        self.free.setdefault(component.pool_slot, []).append(component)
+        self.sizes[name] = self.sizes.get(name, 0) + 1
+        return True
+
+    def statistics(self):
+        """type name: (hits, misses, released components kept)"""
+        names = set(self.hits) | set(self.misses) | set(self.sizes)
+        return {name: (self.hits.get(name, 0), self.misses.get(name, 0), self.sizes.get(name, 0))
+                for name in sorted(names)}
+
+    def clear(self):
+        self.free.clear()
+        self.sizes.clear()
+
+
+# components are shared between levels, so there is one pool
+component_pool = ComponentPool()
@@ -0,0 +1,122 @@
+# timing of the phases of every frame, to find frame spikes
+
+import csv
+import time
+from collections import deque
+
+from game_components import Hud
+from log import get_logger
+from configurations import *
+
+logger = get_logger('profiler')
+
+
+class Phase:
+    """Context manager that adds the time spent inside it to a phase of the current frame"""
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception):
+        elapsed = (time.perf_counter() - self.start) * 1000
+        current = self.profiler.current
+        current[self.name] = current.get(self.name, 0) + elapsed
+
+
+class FrameProfiler:
+    """Times named phases of every frame (milliseconds); a phase can run multiple times per frame.
+    The last frames are kept in ring buffers for percentiles, which can be shown as an overlay,
+    and every frame can be written to a CSV file"""
+    PERCENTILES = (50, 90, 99)
+
+    def __init__(self, history=PROFILER_HISTORY):
+        self.history = history  # amount of frames kept per phase
+        self.frames = {'frame': deque(maxlen=history)}  # phase name: milliseconds of the last frames
+        self.current = {}  # phase name: milliseconds in the current frame
+        self._phases = {}  # phase name: reusable Phase
+        self.frame_count = 0
+        self.frame_start = time.perf_counter()
+        self.csv_file = None
+        self.csv_writer = None
+        self.overlay = False
+        self.hud = Hud()  # a meter per phase in the overlay
+
+    def phase(self, name):
+        phase = self._phases.get(name)
+        if phase is None:
+            phase = self._phases[name] = Phase(self, name)
+            self.frames[name] = deque([0] * len(self.frames['frame']), maxlen=self.history)
+        return phase
+
+    def end_frame(self):
+        """closes the current frame; phases that didn't run in it count as 0 ms"""
+        now = time.perf_counter()
+        self.current['frame'] = (now - self.frame_start) * 1000
+        self.frame_start = now
+        for name, frames in self.frames.items():
+            frames.append(self.current.get(name, 0))
+        if self.csv_file is not None:
+            if self.csv_writer is None:  # the header is written once a whole frame ran, so it has all the phases
+                self.csv_writer = csv.DictWriter(self.csv_file, ['frame_number'] + list(self.frames), restval=0,
+                                                 extrasaction='ignore')  # phases that first run later are left out
+                self.csv_writer.writeheader()
+            self.csv_writer.writerow(dict(self.current, frame_number=self.frame_count))
+        self.frame_count += 1
+        if self.overlay and self.frame_count % PROFILER_OVERLAY_INTERVAL == 0:
+            self.update_overlay()
+        self.current = {}
+
+    def percentiles(self, name):
+        frames = sorted(self.frames[name])
+        if not frames:
+            return tuple(0 for _ in self.PERCENTILES)
+        return tuple(frames[min(len(frames) - 1, len(frames) * percentile // 100)] for percentile in self.PERCENTILES)
+
+    # overlay, one meter per phase
+    def toggle_overlay(self):
+        self.overlay = not self.overlay
+        if self.overlay:
+            self.update_overlay()
+
+    def update_overlay(self):
+        for name in self.frames:
+            if name not in self.hud.meters:
+                pos = (CAMERA_WIDTH - 420, 40 + 18 * len(self.hud))
+                self.hud.add(name, lambda name=name: (name,) + self.percentiles(name), pos,
+                             text_format='{0[0]}: p50 {0[1]:.1f} p90 {0[2]:.1f} p99 {0[3]:.1f} ms',
+                             size=(420, 18), font_size=18)
+        self.hud.update()
+
+    def display(self):
+        if self.overlay:
+            self.hud.display()
+
+    # csv export of every frame
+    def toggle_csv(self, file_name=None):
+        if self.csv_file is None:
+            self.start_csv(file_name)
+        else:
+            self.stop_csv()
+
+    def start_csv(self, file_name=None):
+        if file_name is None:
+            file_name = time.strftime("profile_%Y%m%d_%H%M%S.csv")
+        self.csv_file = open(file_name, 'w', newline='')
+        logger.info("writing frame times to: {}", file_name)
+
+    def stop_csv(self):
+        if self.csv_file is not None:
+            self.csv_file.close()
+            logger.info("frame times written to: {}", self.csv_file.name)
+        self.csv_file = None
+        self.csv_writer = None
+
+
+# the main loop, and the level report to the same profiler
+profiler = FrameProfiler()
@@ -0,0 +1,173 @@
+# the components of a level, indexed by their id
+# adding, and removing is a dictionary operation, instead of a search through a list with __eq__ per element
+
+from contextlib import contextmanager
+
+
+class Bucket:
+    """Components by id, in the order they were added.
+    The list of them is only built again after a change, so iterating it every tick doesn't copy anything;
+    it isn't changed by removing components while it's iterated, and it must not be changed by the caller"""
+    __slots__ = ('components', '_list')
+
+    def __init__(self):
+        self.components = {}  # component id: component
+        self._list = []
+
+    def __len__(self):
+        return len(self.components)
+
+    def __contains__(self, component):
+        return component.id in self.components
+
+    def __iter__(self):
+        return iter(self.list())
+
+    def add(self, component):
+        self.components[component.id] = component
+        self._list = None
+
+    def remove(self, component):
+        """returns whether the component was in the bucket"""
+        if self.components.pop(component.id, None) is None:
+            return False
+        self._list = None
+        return True
+
+    def list(self):
+        if self._list is None:
+            self._list = list(self.components.values())
+        return self._list
+
+    def clear(self):
+        self.components.clear()
+        self._list = []
+
+
+class ComponentRegistry:
+    """The static, and dynamic components, and the characters of a level, with buckets per kind of component:
+    projectiles (moving dynamic components), texts, and the foreground. Texts are indexed by what they say"""
+
+    def __init__(self, projectile_type, text_type, foreground_type):
+        # the kinds are passed in, game_components builds the components that hold a level
+        self.projectile_type = projectile_type
+        self.text_type = text_type
+        self.foreground_type = foreground_type
+        self.static = Bucket()
+        self.dynamic = Bucket()
+        self.components = Bucket()  # static, and dynamic components
+        self.characters = Bucket()
+        self.projectiles = Bucket()
+        self.texts = Bucket()
+        self.foreground = Bucket()
+        self.text_index = {}  # text: {component id: text component}
+
+    def __repr__(self):
+        return (f"components: {len(self.static)} static, {len(self.dynamic)} dynamic, "
+                f"{len(self.characters)} characters")
+
+    def add_static(self, component):
+        self.static.add(component)
+        self.components.add(component)
+        if type(component) == self.foreground_type:
+            self.foreground.add(component)
+
+    def remove_static(self, component):
+        if not self.static.remove(component):
+            return False
+        self.components.remove(component)
+        self.foreground.remove(component)
+        return True
+
+    def add_dynamic(self, component):
+        self.dynamic.add(component)
+        self.components.add(component)
+        if isinstance(component, self.projectile_type):
+            self.projectiles.add(component)
+        elif type(component) == self.text_type:
+            self.texts.add(component)
+            self.text_index.setdefault(component.text, {})[component.id] = component
+
+    def remove_dynamic(self, component):
+        if not self.dynamic.remove(component):
+            return False
+        self.components.remove(component)
+        self.projectiles.remove(component)
+        if self.texts.remove(component):
+            texts = self.text_index[component.text]
+            del texts[component.id]
+            if not texts:
+                del self.text_index[component.text]
+        return True
+
+    def add_character(self, character):
+        self.characters.add(character)
+
+    def remove_character(self, character):
+        return self.characters.remove(character)
+
+    def find_text(self, text):
+        """a text component that says text, or None"""
+        for component in self.text_index.get(text, {}).values():
+            return component
+        return None
+
+    def clear_dynamic(self):
+        """removes everything but the static components"""
+        for component in self.dynamic.list():
+            self.components.remove(component)
+        for bucket in [self.dynamic, self.characters, self.projectiles, self.texts]:
+            bucket.clear()
+        self.text_index.clear()
+
+
+class CommandBuffer:
+    """Adds, and removes of components, recorded while the level iterates them, and applied together at a sync point.
+    Outside of deferred() a command is applied right away"""
+
+    def __init__(self):
+        self.commands = []  # (function, component), in the order they were recorded
+        self.removing = set()  # ids of the components with a recorded removal
+        self.deferring = 0  # nested deferred() blocks
+        self.applied = 0
+
+    def __len__(self):
+        return len(self.commands)
+
+    def run(self, function, component):
+        if self.deferring:
+            self.commands.append((function, component))
+        else:
+            function(component)
+
+    def remove(self, function, component):
+        """like run, but a component is only removed once per batch; a killed monster is removed by the kill,
+        and again by the update of the dead characters"""
+        if self.deferring:
+            if component.id in self.removing:
+                return
+            self.removing.add(component.id)
+        self.run(function, component)
+
+    @contextmanager
+    def deferred(self):
+        """records the commands run in the block, they're applied when the outermost block ends"""
+        self.deferring += 1
+        try:
+            yield self
+        finally:
+            self.deferring -= 1
+            if not self.deferring:
+                self.apply()
+
+    def apply(self):
+        """applies the recorded commands, in the order they were recorded"""
+        commands, self.commands = self.commands, []
+        self.removing.clear()
+        for function, component in commands:
+            function(component)
+        self.applied += len(commands)
+
+    def clear(self):
+        self.commands.clear()
+        self.removing.clear()